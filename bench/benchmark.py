@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+"""
+Time and measure peak memory of each stage of the idplot report generator
+on synthetic alignments. Results are appended to a JSON lines file, one
+record per configuration, so runs can be compared across releases.
+
+    python bench/benchmark.py --length 30000 --queries 10 100 1000
+"""
+
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GENERATOR = os.path.join(REPO, "bin", "idplot.py")
+BASES = "acgt"
+
+
+def load_generator(path=GENERATOR):
+    spec = importlib.util.spec_from_file_location("idplot", path)
+    idplot = importlib.util.module_from_spec(spec)
+    # registered so worker processes can pickle its functions
+    sys.modules["idplot"] = idplot
+    spec.loader.exec_module(idplot)
+    return idplot
+
+
+def mutate(seq, mismatch_rate, gap_rate, rng):
+    seq = list(seq)
+    for i, base in enumerate(seq):
+        r = rng.random()
+        if r < gap_rate:
+            seq[i] = "-"
+        elif r < gap_rate + mismatch_rate:
+            seq[i] = rng.choice(BASES.replace(base, ""))
+    return "".join(seq)
+
+
+def write_fasta(path, records, width=60):
+    with open(path, "w") as fh:
+        for name, seq in records:
+            print(f">{name}", file=fh)
+            for i in range(0, len(seq), width):
+                print(seq[i:i + width], file=fh)
+
+
+def write_gard(path, length, iterations, rng):
+    improvements = dict()
+    breakpoints = []
+    for i in range(iterations):
+        breakpoints = sorted(set(breakpoints + [rng.randrange(1, length - 1)]))
+        improvements[f"{i}"] = dict(breakpoints=[[bp] for bp in breakpoints], deltaAICc=rng.random())
+    with open(path, "w") as fh:
+        json.dump({"input": {"number of sites": length}, "improvements": improvements}, fh)
+    return improvements
+
+
+def write_trees(directory, prefix, length, improvements, names):
+    regions = set()
+    for improvement in improvements.values():
+        start = 0
+        for bp in improvement["breakpoints"]:
+            regions.add((start, bp[0]))
+            start = bp[0] + 1
+        regions.add((start, length))
+
+    paths = []
+    newick = "(" + ",".join(f"{name}:0.01" for name in names) + ");"
+    for start, end in sorted(regions):
+        path = os.path.join(directory, f"{prefix}_{start}_{end}.tree")
+        with open(path, "w") as fh:
+            print(newick, file=fh)
+        paths.append(path)
+    return " ".join(paths)
+
+
+def write_gff(path, length, features, rng):
+    with open(path, "w") as fh:
+        print("##gff-version 3", file=fh)
+        for i in range(features):
+            start = rng.randrange(1, length)
+            end = min(length, start + rng.randrange(100, 3000))
+            print("ref", "bench", "gene", start, end, ".", "+", ".", f"ID=gene-{i};Name=g{i}", sep="\t", file=fh)
+
+
+def make_fixtures(directory, args, queries):
+    rng = random.Random(args.seed)
+    reference = "".join(rng.choice(BASES) for _ in range(args.length))
+    names = ["reference"] + [f"query_{i}" for i in range(queries)]
+    records = [(names[0], reference)] + [
+        (name, mutate(reference, args.mismatch_rate, args.gap_rate, rng)) for name in names[1:]
+    ]
+    msa = os.path.join(directory, "bench.msa.fasta")
+    write_fasta(msa, records)
+    gard = os.path.join(directory, "bench.msa.json")
+    improvements = write_gard(gard, args.length, args.gard_iterations, rng)
+    trees = write_trees(directory, "bench.msa", args.length, improvements, names)
+    gff = os.path.join(directory, "bench.gff3")
+    write_gff(gff, args.length, args.gff_features, rng)
+    return dict(
+        msa=msa,
+        gard=gard,
+        trees=trees,
+        gff=gff,
+        output=os.path.join(directory, "idplot.html"),
+        cache=os.path.join(directory, "cache"),
+    )
+
+
+def stages(idplot, fixtures, window, cpus, windows, options):
+    # each stage reads its inputs from and adds its outputs to `state`; the
+    # parse and process stages break down the time spent in build_data
+    def parse_alignments(state):
+        reference, queries = idplot.parse_alignments(fixtures["msa"])
+        state["reference"] = reference
+        state["queries"] = list(queries)
+
+    def process_queries(state):
+        state["tracks"] = idplot.process_queries_parallel(
+            state["reference"]["seq"], state["queries"], window, cpus, windows=windows
+        )
+
+    def parse_gard(state):
+        state["gard"] = idplot.parse_gard(fixtures["gard"])
+
+    def parse_trees(state):
+        state["trees"] = idplot.parse_trees(fixtures["trees"])
+
+    def parse_gff(state):
+        state["gff"] = idplot.parse_gff(fixtures["gff"], state["reference"]["seq"])
+
+    def build_data(state):
+        state["data"] = idplot.build_data(
+            fixtures["msa"],
+            fixtures["gard"],
+            fixtures["trees"],
+            fixtures["gff"],
+            window,
+            cpus,
+            options["compact"],
+            {"cli": "benchmark", "dir": REPO, "container": ""},
+            cache_dir=fixtures["cache"] if options["cache"] else False,
+            windows=windows,
+        )
+
+    def write_report(state):
+        idplot.write_report(fixtures["output"], state["data"], options["compress"], options["gzip_report"])
+
+    return [parse_alignments, process_queries, parse_gard, parse_trees, parse_gff, build_data, write_report]
+
+
+def measure(idplot, fixtures, window, cpus, repeat, windows=(), options=None):
+    options = options or dict(compact=False, compress=False, gzip_report=False, cache=False)
+    results = dict()
+    # timings are taken without tracemalloc, which slows allocation heavy code;
+    # with the cache, the first repeat fills it and later ones read it
+    for _ in range(repeat):
+        state = dict()
+        for stage in stages(idplot, fixtures, window, cpus, windows, options):
+            start = time.perf_counter()
+            stage(state)
+            elapsed = time.perf_counter() - start
+            result = results.setdefault(stage.__name__, dict(seconds=elapsed))
+            result["seconds"] = min(result["seconds"], elapsed)
+
+    # peak python and numpy allocations of each stage; worker processes
+    # are not traced when cpus > 1
+    state = dict()
+    tracemalloc.start()
+    for stage in stages(idplot, fixtures, window, cpus, windows, options):
+        # also resets the peak; earlier allocations are no longer counted
+        tracemalloc.clear_traces()
+        stage(state)
+        results[stage.__name__]["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    output = f"{fixtures['output']}.gz" if options["gzip_report"] else fixtures["output"]
+    return results, os.path.getsize(output)
+
+
+def revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--length", type=int, default=30000, help="alignment length")
+    p.add_argument("--queries", type=int, nargs="+", default=[10, 100], help="query counts to run")
+    p.add_argument("--mismatch-rate", type=float, default=0.01, help="per site query mismatch rate")
+    p.add_argument("--gap-rate", type=float, default=0.005, help="per site query gap rate")
+    p.add_argument("--window", type=int, default=500, help="identity window size")
+    p.add_argument("--windows", type=int, nargs="*", default=[], help="extra identity window sizes")
+    p.add_argument("--gard-iterations", type=int, default=10, help="GARD improvements to simulate")
+    p.add_argument("--gff-features", type=int, default=200, help="GFF features to simulate")
+    p.add_argument("--cpus", type=int, default=1, help="processes for process_queries")
+    p.add_argument("--compact", action="store_true", help="build the report with compact encoding")
+    p.add_argument("--compress", action="store_true", help="compress the report data")
+    p.add_argument("--gzip-report", action="store_true", help="write a gzipped report")
+    p.add_argument("--cache", action="store_true", help="build the report through a fresh query cache")
+    p.add_argument("--repeat", type=int, default=3, help="timed repeats; the fastest is kept")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--generator", default=GENERATOR, help="report generator to benchmark")
+    p.add_argument("--output", default="benchmark.jsonl", help="JSON lines file results are appended to")
+    args = p.parse_args(argv)
+
+    idplot = load_generator(args.generator)
+    options = dict(compact=args.compact, compress=args.compress, gzip_report=args.gzip_report, cache=args.cache)
+    numpy = idplot.np
+    for queries in args.queries:
+        with tempfile.TemporaryDirectory() as directory:
+            fixtures = make_fixtures(directory, args, queries)
+            results, report_bytes = measure(
+                idplot, fixtures, args.window, args.cpus, args.repeat, args.windows, options
+            )
+
+        record = {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "revision": revision(),
+            "python": platform.python_version(),
+            "numpy": numpy.__version__ if numpy is not None else None,
+            "params": dict(
+                length=args.length,
+                queries=queries,
+                mismatch_rate=args.mismatch_rate,
+                gap_rate=args.gap_rate,
+                window=args.window,
+                windows=args.windows,
+                gard_iterations=args.gard_iterations,
+                gff_features=args.gff_features,
+                cpus=args.cpus,
+                repeat=args.repeat,
+                **options,
+            ),
+            "stages": results,
+            "report_bytes": report_bytes,
+        }
+        with open(args.output, "a") as fh:
+            print(json.dumps(record), file=fh)
+
+        print(f"length={args.length} queries={queries} window={args.window}", file=sys.stderr)
+        for stage, result in results.items():
+            print(f"  {stage:<18}{result['seconds']:>10.3f}s{result['peak_bytes'] / 1e6:>10.1f}MB", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
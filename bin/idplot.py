@@ -0,0 +1,2623 @@
+#!/usr/bin/env python
+
+import base64
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import zlib
+from array import array
+from collections import Counter, defaultdict
+from itertools import accumulate
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TEMPLATE = """<!DOCTYPE html>
+<html>
+
+<head>
+    <meta charset="utf-8" />
+    <meta name="author" content="Joe Brown" />
+    <title>idplot</title>
+{{dependencies}}
+
+
+    <style type="text/css">
+        .disabled_div {
+            pointer-events: none;
+            opacity: 0.4
+        }
+
+        .nav {
+            background-color: #000000 !important;
+        }
+
+        .brand {
+            font-size: 1.2rem;
+            font-family: 'Righteous', cursive;
+            line-height: 1.7;
+        }
+
+        .chart-row {
+            overflow-x: auto;
+            height: 235px;
+            max-width: 100%;
+        }
+
+        .tree-view {
+            width: 430px;
+        }
+
+        .tree-view>svg {
+            cursor: pointer;
+            pointer-events: all;
+        }
+
+        .tree-container {
+            display: flex;
+        }
+
+        .dropdown-header {
+            padding: .25rem .5rem !important;
+            font-weight: bold;
+        }
+
+        .meta-value {
+            overflow-x: scroll;
+            /* white-space: nowrap !important; */
+            font-size: .8rem;
+            padding-right: .5rem;
+        }
+
+        *[id] {
+            scroll-margin-top: 79px;
+        }
+
+        .dropdown-details {
+            width: 400px;
+        }
+
+        .small {
+            font-size: 80%;
+            font-weight: 400;
+        }
+
+        .btn-vsm {
+            vertical-align: inherit !important;
+            padding: 0rem 0rem !important;
+            font-size: inherit !important;
+            line-height: 1 !important;
+        }
+
+        .code {
+            color: #6b6b6b;
+            word-break: break-word;
+        }
+
+        .form-control::placeholder {
+            color: #6c757d;
+            opacity: 1;
+            text-overflow: ellipsis;
+        }
+
+        .plot-color {
+            font-weight: 900;
+            font-size: 1.2rem;
+        }
+
+        .type-select {
+            width: 230px;
+        }
+
+        #sequence-selection {
+            max-height: 620px;
+            overflow-y: auto;
+        }
+
+        .sequence-row {
+            height: 62px;
+        }
+
+        .btn-group-sm>.btn,
+        .btn-sm {
+            padding: .27rem .5rem !important;
+        }
+    </style>
+</head>
+
+<body>
+    <div class="row bg-dark mx-0 p-1 sticky-top nav">
+        <div class="col-2"><a class="brand text-white text-decoration-none"
+                href="https://github.com/brwnj/idplot">idplot</a></div>
+        <div class="col-10 d-flex align-items-center justify-content-end" id="meta-header">
+            <div class="input-group input-group-sm type-select pe-2 d-none" id="window-select">
+                <span class="input-group-text">Window</span>
+                <select class="form-select" id="window-size">
+                </select>
+            </div>
+            <div class="input-group input-group-sm type-select pe-2 d-none" id="annotation-select">
+                <span class="input-group-text">Annotation</span>
+                <select class="form-select" id="annotation-type">
+                </select>
+            </div>
+            <div class="dropdown">
+                <button class="btn btn-sm btn-primary dropdown-toggle" type="button" id="details"
+                    data-bs-toggle="dropdown" aria-haspopup="true" aria-expanded="false">
+                    Run details
+                </button>
+                <div class="dropdown-menu dropdown-menu-right dropdown-details" aria-labelledby="details">
+                    <h6 class="dropdown-header">Reference</h6>
+                    <div class="container meta-value" id="meta-reference"><code></code></div>
+                    <h6 class="dropdown-header">Alignment length</h6>
+                    <div class="container meta-value" id="meta-length"></div>
+                    <h6 class="dropdown-header d-none" id="meta-alignment-header">Alignment strategy</h6>
+                    <div class="container meta-value d-none" id="meta-alignment"></div>
+                    <h6 class="dropdown-header">Nextflow command</h6>
+                    <div class="container meta-value" id="meta-cli"></div>
+                    <h6 class="dropdown-header">Launch directory</h6>
+                    <div class="container meta-value" id="meta-dir"></div>
+                    <h6 class="dropdown-header">Workflow container</h6>
+                    <div class="container meta-value" id="meta-container"></div>
+                </div>
+            </div>
+        </div>
+    </div>
+    <div class="container-fluid w-90">
+        <div class="row p-2 bg-light d-none" id="dendrograms-row-wrapper">
+            <div class="col-4">
+                <h5>GARD refinements</h5>
+            </div>
+            <div class="col-8">
+                <h5>GARD breakpoint trees (iteration <span id="iteration-number">00</span>)</h5>
+            </div>
+            <div class="col-4 ps-0" id="gard-plot"></div>
+            <div class="col-8">
+                <div class="row chart-row ms-0" id="dendrograms-row">
+                    <div class="col-9 tree-container px-0" id="dendrograms"></div>
+                </div>
+            </div>
+        </div>
+        <div class="row">
+            <div class="col-12">
+                <div class="row pt-2 mb-3" id="grid-plot"></div>
+            </div>
+        </div>
+        <div class="row p-2 d-flex">
+            <div class="col-6">
+                <h5>Sequences</h5>
+            </div>
+            <div class="col-6 d-flex align-items-center justify-content-end">
+                <button class="btn btn-primary" id="export-button" type="button" data-toggle="tooltip"
+                    title="Export all sequences as .fasta file">Export all</button>
+            </div>
+            <div class="col-6">
+                <div class="text-muted small">Sequence selection is based on plot zoom level</div>
+            </div>
+            <div class="col-6 d-flex py-2 align-items-center justify-content-end">
+                <div class="form-check form-check-inline me-0">
+                    <input class="form-check-input" type="checkbox" value="" id="remove-gaps">
+                    <label class="form-check-label" for="remove-gaps" title="Remove gaps (-) from sequence exports"
+                        data-toggle="tooltip">
+                        Remove gaps
+                    </label>
+                </div>
+            </div>
+
+            <div class="col-12 pt-2 px-4 mb-4" id="sequence-selection">
+            </div>
+        </div>
+    </div>
+</body>
+
+<script>
+    /*
+  d3.phylogram.js
+
+  Copyright (c) 2013, Ken-ichi Ueda
+
+  All rights reserved.
+
+  Redistribution and use in source and binary forms, with or without
+  modification, are permitted provided that the following conditions are met:
+
+  Redistributions of source code must retain the above copyright notice, this
+  list of conditions and the following disclaimer. Redistributions in binary
+  form must reproduce the above copyright notice, this list of conditions and
+  the following disclaimer in the documentation and/or other materials
+  provided with the distribution.
+
+  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+  POSSIBILITY OF SUCH DAMAGE.
+*/
+
+    if (!d3) { throw "d3 wasn't included!" };
+    (function () {
+        d3.phylogram = {}
+        d3.phylogram.rightAngleDiagonal = function () {
+            var projection = function (d) { return [d.y, d.x]; }
+
+            var path = function (pathData) {
+                return "M" + pathData[0] + ' ' + pathData[1] + " " + pathData[2];
+            }
+
+            function diagonal(diagonalPath, i) {
+                var source = diagonalPath.source,
+                    target = diagonalPath.target,
+                    midpointX = (source.x + target.x) / 2,
+                    midpointY = (source.y + target.y) / 2,
+                    pathData = [source, { x: target.x, y: source.y }, target];
+                pathData = pathData.map(projection);
+                return path(pathData)
+            }
+
+            diagonal.projection = function (x) {
+                if (!arguments.length) return projection;
+                projection = x;
+                return diagonal;
+            };
+
+            diagonal.path = function (x) {
+                if (!arguments.length) return path;
+                path = x;
+                return diagonal;
+            };
+
+            return diagonal;
+        }
+
+        d3.phylogram.radialRightAngleDiagonal = function () {
+            return d3.phylogram.rightAngleDiagonal()
+                .path(function (pathData) {
+                    var src = pathData[0],
+                        mid = pathData[1],
+                        dst = pathData[2],
+                        radius = Math.sqrt(src[0] * src[0] + src[1] * src[1]),
+                        srcAngle = d3.phylogram.coordinateToAngle(src, radius),
+                        midAngle = d3.phylogram.coordinateToAngle(mid, radius),
+                        clockwise = Math.abs(midAngle - srcAngle) > Math.PI ? midAngle <= srcAngle : midAngle > srcAngle,
+                        rotation = 0,
+                        largeArc = 0,
+                        sweep = clockwise ? 0 : 1;
+                    return 'M' + src + ' ' +
+                        "A" + [radius, radius] + ' ' + rotation + ' ' + largeArc + ',' + sweep + ' ' + mid +
+                        'L' + dst;
+                })
+                .projection(function (d) {
+                    var r = d.y, a = (d.x - 90) / 180 * Math.PI;
+                    return [r * Math.cos(a), r * Math.sin(a)];
+                })
+        }
+
+        // Convert XY and radius to angle of a circle centered at 0,0
+        d3.phylogram.coordinateToAngle = function (coord, radius) {
+            var wholeAngle = 2 * Math.PI,
+                quarterAngle = wholeAngle / 4
+
+            var coordQuad = coord[0] >= 0 ? (coord[1] >= 0 ? 1 : 2) : (coord[1] >= 0 ? 4 : 3),
+                coordBaseAngle = Math.abs(Math.asin(coord[1] / radius))
+
+            // Since this is just based on the angle of the right triangle formed
+            // by the coordinate and the origin, each quad will have different
+            // offsets
+            switch (coordQuad) {
+                case 1:
+                    coordAngle = quarterAngle - coordBaseAngle
+                    break
+                case 2:
+                    coordAngle = quarterAngle + coordBaseAngle
+                    break
+                case 3:
+                    coordAngle = 2 * quarterAngle + quarterAngle - coordBaseAngle
+                    break
+                case 4:
+                    coordAngle = 3 * quarterAngle + coordBaseAngle
+            }
+            return coordAngle
+        }
+
+        d3.phylogram.styleTreeNodes = function (vis) {
+            vis.selectAll('g.leaf.node')
+                .append("svg:circle")
+                .attr("r", 4.5)
+                .attr('stroke', 'black')
+                .attr('stroke-width', '1px')
+                .attr('fill', function (d) { return strain_colors(d.name) || 'white' });
+
+            vis.selectAll('g.root.node')
+                .append('svg:circle')
+                .attr("r", 4.5)
+                .attr('fill', 'black')
+                .attr('stroke', 'black')
+                .attr('stroke-width', '1px');
+        }
+
+        function scaleBranchLengths(nodes, w) {
+            // Visit all nodes and adjust y pos width distance metric
+            var visitPreOrder = function (root, callback) {
+                callback(root)
+                if (root.children) {
+                    for (var i = root.children.length - 1; i >= 0; i--) {
+                        visitPreOrder(root.children[i], callback)
+                    };
+                }
+            }
+            visitPreOrder(nodes[0], function (node) {
+                node.rootDist = (node.parent ? node.parent.rootDist : 0) + (node.length || 0)
+            })
+            var rootDists = nodes.map(function (n) { return n.rootDist; });
+            var yscale = d3.scale.linear()
+                .domain([0, d3.max(rootDists)])
+                .range([0, w]);
+            visitPreOrder(nodes[0], function (node) {
+                node.y = yscale(node.rootDist)
+            })
+            return yscale
+        }
+
+        d3.phylogram.build = function (selector, nodes, options) {
+            options = options || {}
+            var w = options.width || d3.select(selector).style('width') || d3.select(selector).attr('width'),
+                h = options.height || d3.select(selector).style('height') || d3.select(selector).attr('height'),
+                w = parseInt(w),
+                h = parseInt(h);
+            var tree = options.tree || d3.layout.cluster()
+                .size([h, w])
+                .sort(function (node) { return node.children ? node.children.length : -1; })
+                .children(options.children || function (node) {
+                    return node.branchset
+                });
+            var diagonal = options.diagonal || d3.phylogram.rightAngleDiagonal();
+            var vis = options.vis || d3.select(selector).append("svg:svg")
+                .attr("width", w + 100)
+                .attr("height", h + 16)
+                //.attr("width", w + 300)
+                //.attr("height", h + 30)
+                .append("svg:g")
+                .attr("transform", "translate(20, 20)");
+            var nodes = tree(nodes);
+
+            if (options.skipBranchLengthScaling) {
+                var yscale = d3.scale.linear()
+                    .domain([0, w])
+                    .range([0, w]);
+            } else {
+                var yscale = scaleBranchLengths(nodes, w)
+            }
+
+            if (!options.skipTicks) {
+                vis.selectAll('line')
+                    .data(yscale.ticks(10))
+                    .enter().append('svg:line')
+                    .attr('y1', 0)
+                    .attr('y2', h)
+                    .attr('x1', yscale)
+                    .attr('x2', yscale)
+                    .attr("stroke", "#ddd");
+
+                vis.selectAll("text.rule")
+                    .data(yscale.ticks(10))
+                    .enter().append("svg:text")
+                    .attr("class", "rule")
+                    .attr("x", yscale)
+                    .attr("y", 0)
+                    .attr("dy", -3)
+                    .attr("text-anchor", "middle")
+                    .attr('font-size', '8px')
+                    .attr('fill', '#000')
+                    .text(function (d) { return Math.round(d * 100) / 100; });
+            }
+
+            var link = vis.selectAll("path.link")
+                .data(tree.links(nodes))
+                .enter().append("svg:path")
+                .attr("class", "link")
+                .attr("d", diagonal)
+                .attr("fill", "none")
+                .attr("stroke", "#000")
+                .attr("stroke-width", "1px");
+
+            var node = vis.selectAll("g.node")
+                .data(nodes)
+                .enter().append("svg:g")
+                .attr("class", function (n) {
+                    if (n.children) {
+                        if (n.depth == 0) {
+                            return "root node"
+                        } else {
+                            return "inner node"
+                        }
+                    } else {
+                        return "leaf node"
+                    }
+                })
+                .attr("transform", function (d) { return "translate(" + d.y + "," + d.x + ")"; })
+
+            d3.phylogram.styleTreeNodes(vis)
+
+            if (!options.skipLabels) {
+                //vis.selectAll('g.inner.node')
+                //  .append("svg:text")
+                //    .attr("dx", -6)
+                //    .attr("dy", -6)
+                //    .attr("text-anchor", 'end')
+                //    .attr('fill', '#ccc')
+                //    .text(function(d) { return d.length; });
+
+                vis.selectAll('g.leaf.node').append("svg:text")
+                    .attr("dx", 8)
+                    .attr("dy", 3)
+                    .attr("text-anchor", "start")
+                    .attr('font-family', 'Helvetica Neue, Helvetica, sans-serif')
+                    .attr('font-size', '10px')
+                    .attr('fill', 'black')
+                    .text(function (d) { return d.name; });
+            }
+
+            return { tree: tree, vis: vis }
+        }
+
+    }());
+
+    /**
+     * Newick format parser in JavaScript.
+     *
+     * Copyright (c) Jason Davies 2010.
+     *
+     * Permission is hereby granted, free of charge, to any person obtaining a copy
+     * of this software and associated documentation files (the "Software"), to deal
+     * in the Software without restriction, including without limitation the rights
+     * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+     * copies of the Software, and to permit persons to whom the Software is
+     * furnished to do so, subject to the following conditions:
+     *
+     * The above copyright notice and this permission notice shall be included in
+     * all copies or substantial portions of the Software.
+     */
+    (function (exports) {
+        exports.parse = function (s) {
+            var ancestors = [];
+            var tree = {};
+            var tokens = s.split(/\\s*(;|\\(|\\)|,|:)\\s*/);
+            for (var i = 0; i < tokens.length; i++) {
+                var token = tokens[i];
+                switch (token) {
+                    case '(': // new branchset
+                        var subtree = {};
+                        tree.branchset = [subtree];
+                        ancestors.push(tree);
+                        tree = subtree;
+                        break;
+                    case ',': // another branch
+                        var subtree = {};
+                        ancestors[ancestors.length - 1].branchset.push(subtree);
+                        tree = subtree;
+                        break;
+                    case ')': // optional name next
+                        tree = ancestors.pop();
+                        break;
+                    case ':': // optional length next
+                        break;
+                    default:
+                        var x = tokens[i - 1];
+                        if (x == ')' || x == '(' || x == ',') {
+                            tree.name = token;
+                        } else if (x == ':') {
+                            tree.length = parseFloat(token);
+                        }
+                }
+            }
+            return tree;
+        };
+    })(
+        // exports will be set in any commonjs platform; use it if it's available
+        typeof exports !== "undefined" ?
+            exports :
+            // otherwise construct a name space.  outside the anonymous function,
+            // "this" will always be "window" in a browser, even in strict mode.
+            this.Newick = {}
+    );
+
+    let data = {{data}}
+    const cov_color = 'rgba(108,117,125,0.2)'
+    const colors = [
+        "#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b",
+        "#e377c2", "#7f7f7f", "#bcbd22", "#17becf", "#7CB5EC", "#434348",
+        "#90ED7D", "#F7A35C", "#8085E9", "#F15C80", "#E4D354", "#2B908F",
+        "#F45B5B", "#91E8E1", "#4E79A7", "#F28E2C", "#E15759", "#76B7B2",
+        "#59A14F", "#EDC949", "#AF7AA1", "#FF9DA7", "#9C755F", "#BAB0AB",
+    ]
+    const colorscale = [
+        [0, "#2ca02c"], [0.2, "#2ca02c"], [0.2, "#1f77b4"], [0.4, "#1f77b4"], [0.4, "#ff7f0e"],
+        [0.6, "#ff7f0e"], [0.6, "#d62728"], [0.8, "#d62728"], [0.8, "#7f7f7f"], [1, "#7f7f7f"],
+    ]
+    let grid_traces = []
+    let selected_trees = false
+    let selected_index
+
+    const decode_base64 = (encoded) => {
+        let binary = atob(encoded)
+        let bytes = new Uint8Array(binary.length)
+        for (let i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i)
+        }
+        return bytes
+    }
+
+    const decode_msa_pyramid = (levels) => {
+        for (const level of levels) {
+            level.positions = new Uint32Array(decode_base64(level.positions).buffer)
+            level.codes = decode_base64(level.codes)
+        }
+    }
+
+    // compact reports carry base64 typed arrays: uint8 colour codes and
+    // identities quantised to uint16
+    const decode_identity = (track) => {
+        let identity = new Uint16Array(decode_base64(track.identity).buffer)
+        track.identity = Float32Array.from(identity, (v) => v / 65535)
+        for (const level of track.pyramid) {
+            for (const stat of ["min", "max", "mean"]) {
+                let quantised = new Uint16Array(decode_base64(level[stat]).buffer)
+                level[stat] = Float32Array.from(quantised, (v) => v / 65535)
+            }
+        }
+    }
+
+    // identity window shown in the ANI plot
+    let selected_window = null
+
+    const set_query_window = (strain_data, window) => {
+        let track = strain_data.windows[window]
+        strain_data.identity = track.identity
+        strain_data.pyramid = track.pyramid
+    }
+
+    const decode_query = (strain_data) => {
+        if (data.encoding == "compact") {
+            decode_identity(strain_data)
+            for (const track of Object.values(strain_data.windows || {})) {
+                decode_identity(track)
+            }
+            strain_data.positions = new Uint32Array(decode_base64(strain_data.positions).buffer)
+            strain_data.codes = decode_base64(strain_data.codes)
+            decode_msa_pyramid(strain_data.msa_pyramid)
+        }
+        // identity of every window size, keyed by size, for the window select
+        if (strain_data.windows) {
+            strain_data.windows[data.window] = { identity: strain_data.identity, pyramid: strain_data.pyramid }
+            if (selected_window != null) {
+                set_query_window(strain_data, selected_window)
+            }
+        }
+        return strain_data
+    }
+
+    const decode_tracks = () => {
+        if (data.encoding == "compact") {
+            data.reference.msa = decode_base64(data.reference.msa)
+            decode_msa_pyramid(data.reference.msa_pyramid)
+        }
+        for (const strain_data of Object.values(data.queries)) {
+            decode_query(strain_data)
+        }
+    }
+
+    // compressed reports hold the gzipped data as base64
+    const load_data = async () => {
+        if (data.compressed) {
+            let stream = new Blob([decode_base64(data.compressed)]).stream()
+                .pipeThrough(new DecompressionStream("gzip"))
+            data = JSON.parse(await new Response(stream).text())
+        }
+        decode_tracks()
+    }
+
+    // split reports keep queries and trees in script shards next to the
+    // report; script tags load them from a web server or from disk
+    const shard_callbacks = {}
+    window.idplot_shard = (key, payload) => {
+        shard_callbacks[key](payload)
+    }
+
+    const load_shard = (key, path) => {
+        return new Promise((resolve, reject) => {
+            let script = document.createElement("script")
+            shard_callbacks[key] = (payload) => {
+                delete shard_callbacks[key]
+                script.remove()
+                resolve(payload)
+            }
+            script.onerror = () => {
+                delete shard_callbacks[key]
+                script.remove()
+                reject(new Error(`could not load ${path}`))
+            }
+            script.src = path
+            document.head.appendChild(script)
+        })
+    }
+
+    // query shards are fetched a few at a time and drawn in batches
+    const shard_concurrency = 6
+    const shard_batch = 100
+
+    const draw_loaded_queries = async () => {
+        let grid_plot = document.getElementById("grid-plot")
+        let xaxis = grid_plot.layout.xaxis
+        // keep the user's zoom across redraws
+        let range = xaxis && !xaxis.autorange && xaxis.range ? [...xaxis.range] : null
+        await build_grid_plots()
+        if (range) {
+            await Plotly.relayout(grid_plot, { "xaxis.range": range })
+        }
+        refresh_sequence_rows()
+        refresh_export_worker()
+    }
+
+    const load_query_shards = async () => {
+        let shards = data.shards.queries
+        let loaded = new Array(shards.length)
+        let next = 0
+        let inserted = 0
+        let drawn = 0
+        const load_next = async () => {
+            while (next < shards.length) {
+                let i = next++
+                let [query, key, path] = shards[i]
+                try {
+                    loaded[i] = decode_query(await load_shard(key, path))
+                } catch (err) {
+                    // a missing shard leaves out its query, not the rest
+                    console.warn(`idplot: ${query} not loaded: ${err.message}`)
+                    loaded[i] = false
+                }
+                // insert in manifest order so colors match the unsplit report
+                while (inserted < shards.length && loaded[inserted] !== undefined) {
+                    if (loaded[inserted]) {
+                        data.queries[shards[inserted][0]] = loaded[inserted]
+                    }
+                    loaded[inserted] = null
+                    inserted++
+                }
+                if (inserted - drawn >= shard_batch) {
+                    drawn = inserted
+                    await draw_loaded_queries()
+                }
+            }
+        }
+        await Promise.all(Array.from({ length: Math.min(shard_concurrency, shards.length) }, load_next))
+        if (drawn < inserted) {
+            await draw_loaded_queries()
+        }
+    }
+
+    const load_trees = async (idx) => {
+        if (!data.shards || !(idx in data.shards.trees)) {
+            return
+        }
+        let [key, path] = data.shards.trees[idx]
+        Object.assign(data.trees, await load_shard(key, path))
+        delete data.shards.trees[idx]
+    }
+
+    // heatmap rows leave unmapped bases (255 in compact reports) blank
+    const msa_row = (codes) => {
+        if (Array.isArray(codes)) {
+            return codes
+        }
+        return Array.from(codes, (v) => v == 255 ? "" : v)
+    }
+
+    // expand sorted sparse colour codes into a row covering [first, last)
+    const expand_sparse = (positions, codes, first, last) => {
+        let row = new Array(last - first).fill("")
+        let lo = 0
+        let hi = positions.length
+        while (lo < hi) {
+            let mid = (lo + hi) >> 1
+            if (positions[mid] < first) {
+                lo = mid + 1
+            } else {
+                hi = mid
+            }
+        }
+        for (let i = lo; i < positions.length && positions[i] < last; i++) {
+            row[positions[i] - first] = codes[i]
+        }
+        return row
+    }
+
+    // index range of a track of length n visible in the plot x range, plus
+    // half a view either side so short pans stay drawn
+    const view_bounds = (n, range, offset = 0) => {
+        let start = 0
+        let end = n
+        if (range) {
+            start = Math.min(Math.max(Math.floor(range[0] - offset), 0), n)
+            end = Math.min(Math.max(Math.ceil(range[1] - offset) + 1, 0), n)
+        }
+        let span = end - start
+        return {
+            span: span,
+            lo: Math.max(0, Math.floor(start - span / 2)),
+            hi: Math.min(n, Math.ceil(end + span / 2)),
+        }
+    }
+
+    // finest pyramid level keeping span within data.pyramid_points; -1 for
+    // full resolution
+    const pyramid_level = (levels, span) => {
+        if (span <= data.pyramid_points) {
+            return -1
+        }
+        for (const [i, level] of levels.entries()) {
+            if (span / level.bin <= data.pyramid_points) {
+                return i
+            }
+        }
+        return levels.length - 1
+    }
+
+    jQuery('.dropdown-menu').on("click.bs.dropdown", (e) => {
+        e.stopPropagation()
+        e.preventDefault()
+    })
+
+    const strain_colors = (strain_id) => {
+        for (const [i, strain] of Object.keys(data.queries).entries()) {
+            if (strain_id == strain) {
+                return colors[i % colors.length]
+            }
+        }
+        return "#000000"
+    }
+
+    // traces only hold the visible columns once zoomed, so the x axis and
+    // rangeslider are given the whole alignment rather than autoranged
+    const full_x_range = () => [0, data.reference.seq.length]
+
+    const plot_layout = () => {
+        let y_range = 1.12
+        if (!(data.gff) || Object.keys(data.gff).length == 0) {
+            y_range = 1
+        }
+
+        let layout = {
+            title: "",
+            margin: { t: 10, b: 40, r: 40 },
+            height: 550 + (Object.keys(data.queries).length * 10),
+            xaxis: {
+                title: "Position", range: full_x_range(), autorange: false, showgrid: false, showlines: false, zeroline: false,
+                rangeslider: { range: full_x_range(), autorange: false },
+            },
+            yaxis: { title: "", fixedrange: true, showgrid: false, showspikes: false, domain: [0.65, 1], automargin: true },
+            yaxis2: { title: "ANI", showgrid: true, showticklabels: true, tickmode: 'array', tickvals: [0, 0.2, 0.4, 0.6, 0.8, 1], range: [0, y_range], autorange: false, zeroline: true, domain: [0, 0.60] },
+            yaxis3: {},
+            yaxis4: {},
+            hovermode: "closest",
+            showlegend: false,
+            grid: { rows: 2, columns: 1, subplots: [['xy2', 'xy']], pattern: 'independent' },
+            shapes: [],
+        }
+        if (data.gard) {
+            layout.yaxis2.domain = [0, 0.45]
+            layout.yaxis.domain = [0.60, 1]
+            layout.yaxis4 = {
+                title: "GARD", fixedrange: true, range: [-2, 3], showticklabels: false, showgrid: false, zeroline: false, domain: [0.45, 0.60]
+            }
+            layout.grid.rows += 1
+            layout.grid.subplots[0].push('xy4')
+        }
+        return layout
+    }
+
+    const plot_config = {
+        displaylogo: false,
+        modeBarButtonsToRemove: ["select2d", "lasso2d"],
+    }
+
+    // pyramid level (-1 for full resolution), bin size and bin range of a
+    // track for the plot x range; [bin, first, last] identifies what is drawn
+    const track_resolution = (n, levels, range, offset = 0) => {
+        let view = view_bounds(n, range, offset)
+        let idx = pyramid_level(levels, view.span)
+        if (idx < 0) {
+            return { idx: idx, bin: 1, first: view.lo, last: view.hi, key: [1, view.lo, view.hi] }
+        }
+        let bin = levels[idx].bin
+        let first = Math.floor(view.lo / bin)
+        let last = Math.ceil(view.hi / bin)
+        return { idx: idx, bin: bin, first: first, last: last, key: [bin, first, last] }
+    }
+
+    const ani_resolution = (strain_data, window, range) => {
+        return track_resolution(strain_data.identity.length, strain_data.pyramid, range, window / 2)
+    }
+
+    // identity values for the visible range at the matching pyramid level
+    const ani_track = (strain_data, window, range) => {
+        let offset = window / 2
+        let n = strain_data.identity.length
+        let res = ani_resolution(strain_data, window, range)
+        if (res.idx < 0) {
+            return {
+                x: Array.from({ length: res.last - res.first }, (v, k) => offset + res.first + k),
+                y: strain_data.identity.slice(res.first, res.last),
+                envelope: { x: [], y: [] },
+                resolution: res.key,
+            }
+        }
+        let level = strain_data.pyramid[res.idx]
+        let first = res.first
+        let last = res.last
+        let x = []
+        for (let i = first; i < last; i++) {
+            let bin_start = i * level.bin
+            x.push(offset + bin_start + (Math.min(level.bin, n - bin_start) - 1) / 2)
+        }
+        return {
+            x: x,
+            y: level.mean.slice(first, last),
+            // bin min and max outline one closed polygon: along the maxima,
+            // then back along the minima
+            envelope: {
+                x: x.concat([...x].reverse()),
+                y: level.max.slice(first, last).concat(level.min.slice(first, last).reverse()),
+            },
+            resolution: res.key,
+        }
+    }
+
+    // each query's min/max envelope is drawn as one filled path directly
+    // before its mean line
+    const get_ani_traces = (q, window, range) => {
+        let traces = []
+        for (const [strain_id, strain_data] of Object.entries(q)) {
+            let track = ani_track(strain_data, window, range)
+            traces.push({
+                x: track.envelope.x,
+                y: track.envelope.y,
+                xaxis: "x",
+                yaxis: "y2",
+                hoverinfo: "skip",
+                type: "scatter",
+                mode: "none",
+                fill: "toself",
+                fillcolor: strain_colors(strain_id),
+                opacity: 0.3,
+                name: "envelope",
+            })
+            let trace = {
+                x: track.x,
+                y: track.y,
+                resolution: track.resolution,
+                text: strain_id,
+                xaxis: "x",
+                yaxis: "y2",
+                connectgaps: false,
+                hoverinfo: "text+x+y",
+                type: "scatter",
+                mode: "lines",
+                name: "significant",
+                marker: {
+                    width: 1,
+                    color: strain_colors(strain_id)
+                }
+            }
+            traces.push(trace)
+        }
+        return traces
+    }
+
+    // swap msa and ani traces to the pyramid level matching the current zoom;
+    // traces are only rebuilt when their resolution changes
+    const update_resolution = () => {
+        let grid_plot = document.getElementById("grid-plot")
+        let range = grid_plot.layout.xaxis.range
+        let update = { x: [], y: [] }
+        let indexes = []
+        for (let i = 0; i < grid_traces.length; i++) {
+            if (grid_traces[i].tracktype == "msa") {
+                let res = msa_resolution(data.reference, range)
+                if (res.key.join() != grid_traces[i].resolution.join()) {
+                    let msa_trace = get_msa_traces(data.queries, data.reference, range)
+                    grid_traces[i].resolution = msa_trace.resolution
+                    Plotly.restyle(grid_plot, { x: [msa_trace.x], z: [msa_trace.z], text: [msa_trace.text] }, [i])
+                }
+            }
+            if (grid_traces[i].name != "significant") {
+                continue
+            }
+            let strain_data = data.queries[grid_traces[i].text]
+            if (ani_resolution(strain_data, selected_window, range).key.join() == grid_traces[i].resolution.join()) {
+                continue
+            }
+            let track = ani_track(strain_data, selected_window, range)
+            grid_traces[i].resolution = track.resolution
+            update.x.push(track.envelope.x, track.x)
+            update.y.push(track.envelope.y, track.y)
+            indexes.push(i - 1, i)
+        }
+        if (indexes.length > 0) {
+            Plotly.restyle(grid_plot, update, indexes)
+        }
+    }
+
+    const handle_plot_relayout = () => {
+        update_resolution()
+        update_annotation_trace()
+        draw_sequences_debounced()
+    }
+
+    const msa_resolution = (reference, range) => {
+        return track_resolution(reference.seq.length, reference.msa_pyramid, range)
+    }
+
+    // heatmap of the visible columns; zoomed out views use the majority
+    // colour of each pyramid bin
+    const get_msa_traces = (queries, reference, range) => {
+        let n = reference.seq.length
+        let res = msa_resolution(reference, range)
+        let idx = res.idx
+        let first = res.first
+        let last = res.last
+        let bin = res.bin
+        let z = []
+        let y = []
+        let text = []
+        for (const [strain_id, strain_data] of Object.entries(queries)) {
+            let track = idx < 0 ? strain_data : strain_data.msa_pyramid[idx]
+            z.push(expand_sparse(track.positions, track.codes, first, last))
+            y.push(strain_id)
+            text.push([])
+        }
+        if (idx < 0) {
+            z.push(msa_row(reference.msa.slice(first, last)))
+            text.push(Array.from(reference.seq.slice(first, last)))
+        } else {
+            let level = reference.msa_pyramid[idx]
+            z.push(expand_sparse(level.positions, level.codes, first, last))
+            text.push([])
+        }
+        y.push(reference.name)
+
+        return {
+            x: Array.from({ length: last - first }, (v, k) => {
+                let bin_start = (first + k) * bin
+                return bin_start + (Math.min(bin, n - bin_start) - 1) / 2
+            }),
+            y: y,
+            z: z,
+            text: text,
+            resolution: res.key,
+            hoverinfo: "text+x+y",
+            hoverongaps: false,
+            xaxis: "x",
+            yaxis: "y",
+            type: "heatmap",
+            tracktype: "msa",
+            colorscale: colorscale,
+            showscale: false,
+        }
+    }
+
+    const get_gard_trace = () => {
+        let x = []
+        let y = []
+        let text = []
+        if (!(selected_trees)) {
+            return []
+        }
+        for (const [idx, arr] of selected_trees.entries()) {
+            let start = arr[0]
+            let end = arr[1]
+            // `range` replacement
+            let a = Array.from({ length: end - start + 1 }, (v, k) => k + start)
+            for (let i of a) {
+                x.push(i)
+                y.push(idx % 2)
+                text.push(`${start}-${end}`)
+            }
+            x.push("")
+            y.push("")
+            text.push("")
+        }
+        return {
+            x: x,
+            y: y,
+            text: text,
+            xaxis: "x",
+            yaxis: "y4",
+            hoverinfo: "text",
+            type: "scatter",
+            name: "breakpoints",
+            tracktype: "breakpoints",
+            connectgaps: false,
+            showlegend: false,
+            line: {
+                width: 10, color: colors[7]
+            },
+        }
+    }
+
+    // features of the selected type overlapping columns [lo, hi)
+    const visible_features = (feature_type, lo, hi) => {
+        let index = data.gff[feature_type]
+        let visible = []
+        for (let block = 0; block < index.max_end.length; block++) {
+            let first = block * data.gff_block
+            // features are sorted by start
+            if (index.features[first][0] >= hi) {
+                break
+            }
+            if (index.max_end[block] < lo) {
+                continue
+            }
+            let last = Math.min(first + data.gff_block, index.features.length)
+            for (let i = first; i < last; i++) {
+                let feature = index.features[i]
+                if (feature[0] < hi && feature[1] >= lo) {
+                    visible.push([i, feature])
+                }
+            }
+        }
+        return visible
+    }
+
+    const get_annotation_trace = (range) => {
+        if (!(data.gff)) {
+            return []
+        }
+
+        if (Object.keys(data.gff).length == 0) {
+            return []
+        }
+
+        let x = []
+        let y = []
+        let text = []
+
+        let feature_type = document.getElementById("annotation-type").value
+        let view = view_bounds(data.reference.seq.length, range)
+        for (const [i, region] of visible_features(feature_type, view.lo, view.hi)) {
+            let t = region[2].replaceAll(";", "<br>")
+            // alternate rows by feature order so rows are stable while panning
+            let offset = i % 2 == 0 ? 1.1 : 1.05
+
+            x.push(region[0])
+            y.push(offset)
+            text.push(t)
+            x.push(region[1])
+            y.push(offset)
+            text.push(t)
+            x.push("")
+            y.push("")
+            text.push("")
+        }
+        return {
+            x: x,
+            y: y,
+            text: text,
+            resolution: [feature_type, view.lo, view.hi],
+            xaxis: "x",
+            yaxis: "y2",
+            type: "scatter",
+            name: "annotation",
+            connectgaps: false,
+            showlegend: false,
+            line: { width: 2, color: "black" },
+            mode: "lines+markers",
+            hoverinfo: "text+x+name",
+            hoverlabel: { namelength: -1 },
+            marker: {
+                size: 6,
+                symbol: "square",
+                color: "black",
+                line: { width: 1, color: "white" },
+            },
+        }
+    }
+
+    // redraw only the annotation trace for the current view or feature type
+    const update_annotation_trace = (force = false) => {
+        let grid_plot = document.getElementById("grid-plot")
+        let i = grid_traces.findIndex((trace) => trace.name == "annotation")
+        if (i < 0) {
+            return
+        }
+        let range = grid_plot.layout.xaxis.range
+        let view = view_bounds(data.reference.seq.length, range)
+        let resolution = [document.getElementById("annotation-type").value, view.lo, view.hi]
+        if (!force && resolution.join() == grid_traces[i].resolution.join()) {
+            return
+        }
+        let trace = get_annotation_trace(range)
+        grid_traces[i].resolution = trace.resolution
+        Plotly.restyle(grid_plot, { x: [trace.x], y: [trace.y], text: [trace.text] }, [i])
+    }
+
+    const build_grid_plots = () => {
+        let ani_traces = get_ani_traces(data.queries, selected_window)
+        let msa_trace = get_msa_traces(data.queries, data.reference)
+        let gard_trace = get_gard_trace()
+        let annotation_trace = get_annotation_trace()
+        // global var
+        grid_traces = [msa_trace, gard_trace, annotation_trace, ...ani_traces]
+
+        // let layout = plot_layout()
+        let grid_plot = document.getElementById("grid-plot")
+        let p_obj = Plotly.react(grid_plot, grid_traces, plot_layout(), plot_config)
+        grid_plot.removeAllListeners("plotly_click")
+        grid_plot.removeAllListeners("plotly_doubleclick")
+        grid_plot.removeAllListeners("plotly_relayout")
+        grid_plot.on("plotly_click", handle_plot_click)
+        grid_plot.on("plotly_doubleclick", handle_plot_doubleclick)
+        grid_plot.on("plotly_relayout", handle_plot_relayout)
+        grid_plot.on("plotly_afterplot", () => {
+            let yticks = jQuery("#grid-plot .yaxislayer-above > .ytick > text")
+            for (const [key, value] of Object.entries(yticks)) {
+                tick = jQuery(value)
+                if (Object.keys(data.queries).includes(tick.text())) {
+                    tick.css({
+                        fill: strain_colors(tick.text()),
+                        "font-weight": 600,
+                    })
+                }
+            }
+        })
+
+        grid_plot.classList.remove("disabled_div")
+        return p_obj
+    }
+
+    const update_grid_plot = () => {
+        let gard_trace = get_gard_trace()
+        let grid_plot = document.getElementById("grid-plot")
+        Plotly.restyle(grid_plot, { x: [gard_trace.x], y: [gard_trace.y], text: [gard_trace.text] }, [1])
+    }
+
+    const handle_dendrogram_click = (start, end, scroll=true) => {
+        let treeplot = document.getElementById(`${start}-${end}-dendrogram`)
+        if (treeplot == null) {
+            return
+        }
+        jQuery(".tree-view").removeClass("border-primary bg-white")
+        jQuery(".tree-view").addClass("border-light bg-light")
+
+        treeplot.classList.add("border-primary")
+        treeplot.classList.add("bg-white")
+        treeplot.classList.remove("border-light")
+
+        if (scroll) {
+            treeplot.scrollIntoView({ behavior: "smooth", block: "start", inline: "center" })
+        }
+
+        // highlight this region in grid-plot
+        let shape = [{
+            type: "rect",
+            x0: start,
+            y0: 0.47,
+            x1: end,
+            y1: 0.57,
+            xref: "x",
+            yref: "paper",
+            line: {
+                width: 1,
+                color: "#007bff",
+            }
+        }]
+        Plotly.relayout("grid-plot", { shapes: shape })
+    }
+
+    const handle_plot_click = (click_data) => {
+        if (click_data.points[0].data.tracktype == 'breakpoints') {
+            let bp = click_data.points[0].text
+
+            let coords = bp.split("-")
+            let start = coords[0]
+            let end = coords[1]
+            // selected_coords = [start, end]
+            handle_dendrogram_click(start, end)
+        } else {
+            let sample_id = click_data.points[0].data.text
+            if (sample_id) {
+                highlight_plot_traces(sample_id)
+            }
+        }
+    }
+
+    const handle_plot_doubleclick = () => {
+        jQuery(".tree-view").removeClass("border-primary bg-white")
+        jQuery(".tree-view").addClass("border-light bg-light")
+        // back to the whole alignment; clear highlights and region shapes
+        highlight_plot_traces(false)
+        Plotly.relayout("grid-plot", { shapes: [], "xaxis.range": full_x_range(), "xaxis.autorange": false })
+    }
+
+    // grey out all sample traces except sample_id; false restores all colors
+    const highlight_plot_traces = (sample_id) => {
+        let trace_colors = []
+        let indexes = []
+        for (let i = 0; i < grid_traces.length; i++) {
+            // limit to significant sample traces
+            if (grid_traces[i].name != "significant") {
+                continue
+            }
+            let text = grid_traces[i].text
+            let color = !sample_id || sample_id.includes(text) ? strain_colors(text) : cov_color
+            // the query's envelope precedes its line
+            indexes.push(i - 1, i)
+            trace_colors.push(color, color)
+        }
+        return Plotly.restyle("grid-plot", { "marker.color": trace_colors, fillcolor: trace_colors }, indexes)
+    }
+
+    const build_newick = (str, div_id) => {
+        let newick = Newick.parse(str)
+        let nodes = []
+        function build_newick_nodes(node, callback) {
+            nodes.push(node)
+            if (node.branchset) {
+                for (let i; i < node.branchset.length; i++) {
+                    build_newick_nodes(node.branchset[i])
+                }
+            }
+        }
+        build_newick_nodes(newick)
+        let d = document.getElementById(div_id)
+        d3.phylogram.build(d, newick, {
+            width: 330,
+            height: 180
+        })
+        d.addEventListener("mouseover", (e) => {
+            let coords = e.target.parentElement.id.split("-")
+            handle_dendrogram_click(coords[0], coords[1], scroll=false)
+        })
+    }
+
+    const zoom_grid_plot = (id) => {
+        let coords = id.split('-')
+        let start = coords[0]
+        let end = coords[1]
+
+        let layout = plot_layout()
+        layout.xaxis.range = [start, end]
+        layout.xaxis.autorange = false
+        Plotly.relayout("grid-plot", layout)
+    }
+
+    const build_dendrograms = () => {
+        return new Promise((resolve, reject) => {
+            document.getElementById("dendrograms-row-wrapper").classList.remove("d-none")
+            let d = document.getElementById("dendrograms")
+            d.innerHTML = ""
+            for (const arr of selected_trees) {
+                let start = arr[0]
+                let end = arr[1]
+                let newick = arr[2]
+                let field_id = `${start}-${end}`
+                d.insertAdjacentHTML("beforeend", `
+                    <div class="tree-view border border-light rounded pt-1 pl-1" id="${field_id}-dendrogram">
+                        <div class="small">Region: <button type="button" class="btn btn-vsm btn-link tree-zoom" id="${field_id}-zoom" onClick="zoom_grid_plot(this.id)">${field_id}</div>
+                    </div>
+                `)
+                build_newick(newick, `${field_id}-dendrogram`)
+            }
+            resolve()
+        })
+    }
+
+    const format_duration = (seconds) => {
+        let parts = []
+        for (const [unit, size] of [["h", 3600], ["m", 60]]) {
+            if (seconds >= size) {
+                parts.push(`${Math.floor(seconds / size)}${unit}`)
+                seconds %= size
+            }
+        }
+        parts.push(`${seconds}s`)
+        return parts.join(" ")
+    }
+
+    const update_details = (name, length, cli, dir, container, alignment) => {
+        document.getElementById("meta-reference").innerHTML = name
+        document.getElementById("meta-length").innerHTML = length
+        if (alignment) {
+            document.getElementById("meta-alignment-header").classList.remove("d-none")
+            let details = document.getElementById("meta-alignment")
+            details.classList.remove("d-none")
+            details.innerHTML = `${alignment.strategy}: ${alignment.sequences} sequences in ${format_duration(parseInt(alignment.seconds))}<br><code>${alignment.command}</code>`
+        }
+        document.getElementById("meta-cli").innerHTML = `<code>${cli}<code>`
+        document.getElementById("meta-dir").innerHTML = `<code>${dir}<code>`
+        document.getElementById("meta-container").innerHTML = `<code>${container}<code>`
+    }
+
+    const get_selected_range = () => {
+        let p = document.getElementById("grid-plot")
+        let start = p.layout.xaxis.range[0] < 0 ? 0 : Math.round(p.layout.xaxis.range[0])
+        let end = Math.round(p.layout.xaxis.range[1])
+        return [start, end]
+    }
+
+    const get_seq_by_id = (id) => {
+        let [start, end] = get_selected_range()
+        let seq
+        if (id == data.reference.name) {
+            seq = data.reference.seq.substring(start, end)
+        } else {
+            seq = data.queries[id].seq.substring(start, end)
+        }
+        if (jQuery("#remove-gaps").is(":checked")) {
+            seq = seq.replaceAll("-", "")
+        }
+        return seq
+    }
+
+    const build_gard_plot = () => {
+        let x = []
+        let y = []
+        let selected_x
+        let selected_y
+        cum_daic = 0
+        for (const [imp_id, bp_obj] of Object.entries(data.gard.improvements)) {
+            cum_daic += bp_obj.deltaAICc
+            x.push(parseInt(imp_id))
+            y.push(cum_daic)
+            selected_x = parseInt(imp_id)
+            selected_y = cum_daic
+        }
+
+        let layout = {
+            margin: { t: 0, b: 30, r: 20 },
+            height: 235,
+            paper_bgcolor: '#f8f9fa',
+            xaxis: {
+                title: "Iteration",
+                rangemode: "tozero",
+            },
+            yaxis: {
+                title: "Cumulative &#x394;AIC",
+            },
+            annotations: [{
+                text: "Selected: " + selected_x,
+                x: selected_x,
+                y: selected_y,
+                showarrow: true,
+                arrowhead: 6,
+                ax: 0,
+                ay: 40,
+                font: {size: 14},
+                bgcolor: 'rgba(255, 255, 255, 0.8)',
+            }]
+        }
+
+        trace = [{
+            x: x,
+            y: y,
+            mode: "lines+markers",
+            marker: { size: 10, color: "rgb(211,211,211,0.5)", line: { color: 'rgb(40,40,40)', width: 1 } },
+            line: {
+                color: "black",
+                width: 1
+            }
+        }]
+
+        let p = document.getElementById("gard-plot")
+        let p_obj = Plotly.react(p, trace, layout, { displayModeBar: false })
+        p.removeAllListeners("plotly_click")
+        p.on("plotly_click", handle_iteration_click)
+        return p_obj
+    }
+
+    const get_trees = (idx) => {
+        let start = 0
+        let trees = []
+        for (let end of data.gard.improvements[idx].breakpoints) {
+            end = end[0]
+            trees.push([start, end, data.trees[`${start}_${end}`].replace(";", "")])
+            start = end + 1
+        }
+        trees.push([start, data.reference.seq.length, data.trees[`${start}_${data.reference.seq.length}`]])
+        return trees
+    }
+
+    const update_tree_data = () => {
+        build_dendrograms().then(() => {
+            handle_dendrogram_click(0, data.gard.improvements[selected_index].breakpoints[0][0])
+        })
+        update_grid_plot()
+    }
+
+    const handle_iteration_click = async (click_data) => {
+        document.getElementById("iteration-number").innerHTML = click_data.points[0].x
+        selected_index = click_data.points[0].x
+        annotations = [{
+            text: 'Selected: ' + click_data.points[0].x,
+            x: click_data.points[0].x,
+            y: parseFloat(click_data.points[0].y.toPrecision(4)),
+            showarrow: true,
+            arrowhead: 6,
+            ax: 0,
+            ay: 40,
+            font: {size: 14},
+            bgcolor: 'rgba(255, 255, 255, 0.8)',
+        }]
+        Plotly.relayout("gard-plot", { annotations: annotations })
+
+        await load_trees(click_data.points[0].x)
+        selected_trees = get_trees(click_data.points[0].x)
+        update_tree_data()
+    }
+
+    // only the rows scrolled into view are in the DOM
+    const sequence_row_height = 62
+    const sequence_row_overscan = 5
+    let sequence_ids = []
+
+    const sequence_row = (id, i) => {
+        let label = `<span class="plot-color" style="color:${strain_colors(id)}">|</span> ${id}`
+        if (i == 0) {
+            label = `${id} (Reference)`
+        }
+        return `
+            <div class="sequence-row">
+                <label for="${id}-seq">${label}</label>
+                <div class="input-group input-group-sm pb-2">
+                    <input class="form-control text-monospace" type="text" placeholder="${get_seq_by_id(id)}" id="${id}-seq" readonly="">
+                    <button class="btn btn-primary" type="button" id="${id}-copy-btn" title="Copy selected region" data-toggle="tooltip" onclick="copy('${id}')">Copy</button>
+                    <button class="btn btn-primary blast-btn" type="button" id="${id}-blast-btn" title="Send selected region to BLAST" data-toggle="tooltip" onclick="blast('${id}')">BLAST</button>
+                </div>
+            </div>
+            `
+    }
+
+    const render_sequence_rows = () => {
+        let seq_sel = document.getElementById("sequence-selection")
+        let first = Math.max(0, Math.floor(seq_sel.scrollTop / sequence_row_height) - sequence_row_overscan)
+        let last = Math.min(
+            sequence_ids.length,
+            Math.ceil((seq_sel.scrollTop + seq_sel.clientHeight) / sequence_row_height) + sequence_row_overscan
+        )
+        let rows = document.getElementById("sequence-rows")
+        rows.style.paddingTop = `${first * sequence_row_height}px`
+        rows.style.paddingBottom = `${(sequence_ids.length - last) * sequence_row_height}px`
+        rows.innerHTML = sequence_ids.slice(first, last).map((id, i) => sequence_row(id, first + i)).join("")
+        jQuery('#sequence-rows [data-toggle="tooltip"]').tooltip()
+        toggle_blast_button()
+    }
+
+    // picks up added queries without moving the panel's scroll position
+    const refresh_sequence_rows = () => {
+        sequence_ids = [data.reference.name, ...Object.keys(data.queries)]
+        render_sequence_rows()
+    }
+
+    const init_sequences = () => {
+        let seq_sel = document.getElementById("sequence-selection")
+        seq_sel.innerHTML = '<div id="sequence-rows"></div>'
+        let scheduled = false
+        seq_sel.onscroll = () => {
+            if (scheduled) {
+                return
+            }
+            scheduled = true
+            requestAnimationFrame(() => {
+                scheduled = false
+                render_sequence_rows()
+            })
+        }
+        refresh_sequence_rows()
+    }
+
+    const toggle_blast_button = () => {
+        // disable for anything longer than 8k...
+        let [start, end] = get_selected_range()
+        if (end - start > 8000) {
+            document.querySelectorAll('.blast-btn').forEach(elem => {
+                elem.disabled = true
+                jQuery(`#${elem.id}`).attr("data-original-title", "Selection too long (>8kb)").tooltip("update")
+            })
+        } else {
+            document.querySelectorAll('.blast-btn').forEach(elem => {
+                elem.disabled = false
+                jQuery(`#${elem.id}`).attr("data-original-title", "Send selected region to BLAST").tooltip("update")
+            })
+        }
+    }
+
+    const draw_sequences = () => {
+        // rendered rows only; the rest pick up the selection when scrolled to
+        document.querySelectorAll("#sequence-rows input").forEach(elem => {
+            elem.placeholder = get_seq_by_id(elem.id.slice(0, -"-seq".length))
+        })
+        toggle_blast_button()
+    }
+
+    const debounce = (fn, wait) => {
+        let timer
+        return (...args) => {
+            clearTimeout(timer)
+            timer = setTimeout(() => fn(...args), wait)
+        }
+    }
+
+    // zooming fires relayout repeatedly; extract sequences once it settles
+    const draw_sequences_debounced = debounce(draw_sequences, 150)
+
+    const copy = (id) => {
+        var $temp = $("<input>")
+        $("body").append($temp)
+
+        $temp.val(get_seq_by_id(id)).select()
+        document.execCommand("copy")
+        $temp.remove()
+
+        $(`#${id}-copy-btn`).attr("title", "Copied!").tooltip("_fixTitle").tooltip("show").attr("title", "Copy selected region").tooltip("_fixTitle")
+    }
+
+    const blast = (id) => {
+        let seq = get_seq_by_id(id)
+        let url = new URL(`https://blast.ncbi.nlm.nih.gov/Blast.cgi?QUERY=${seq}&DATABASE=nt&PROGRAM=blastn&CMD=put`)
+        window.open(url)
+    }
+
+    // https://robkendal.co.uk/blog/2020-04-17-saving-text-to-client-side-file-using-vanilla-js
+    const download_to_file = (content, filename, contentType = 'text/plain') => {
+        const a = document.createElement('a');
+        const file = content instanceof Blob ? content : new Blob([content], { type: contentType });
+
+        a.href = URL.createObjectURL(file);
+        a.download = filename;
+        a.click();
+
+        URL.revokeObjectURL(a.href);
+    };
+
+    // records are added to the blob piece by piece rather than joined into
+    // one string; also runs inside the export worker
+    const build_fasta_blob = (records, request) => {
+        let parts = []
+        for (const [name, seq] of records) {
+            let selected = seq.substring(request.start, request.end)
+            if (request.remove_gaps) {
+                selected = selected.replaceAll("-", "")
+            }
+            parts.push(">" + name + "\\n", selected + "\\n")
+        }
+        return new Blob(parts, { type: "text/plain" })
+    }
+
+    const export_worker_main = () => {
+        let records = []
+        self.onmessage = (e) => {
+            if (e.data.type == "init") {
+                records = e.data.records
+                return
+            }
+            if (e.data.type == "append") {
+                records = records.concat(e.data.records)
+                return
+            }
+            self.postMessage(build_fasta_blob(records, e.data))
+        }
+    }
+
+    const export_records = () => {
+        let records = [[data.reference.name, data.reference.seq]]
+        for (const [query, strain_data] of Object.entries(data.queries)) {
+            records.push([query, strain_data.seq])
+        }
+        return records
+    }
+
+    // sequences are copied to the worker on the first export; queries added
+    // to the report later are appended, as export_records keeps their order
+    let export_worker = false
+    let export_synced = 0
+    const get_export_worker = () => {
+        if (!export_worker) {
+            let source = new Blob([
+                "const build_fasta_blob = " + build_fasta_blob.toString() + ";",
+                "(" + export_worker_main.toString() + ")()",
+            ], { type: "text/javascript" })
+            export_worker = new Worker(URL.createObjectURL(source))
+            let records = export_records()
+            export_worker.postMessage({ type: "init", records: records })
+            export_synced = records.length
+        }
+        return export_worker
+    }
+
+    const refresh_export_worker = () => {
+        if (!export_worker) {
+            return
+        }
+        let records = export_records().slice(export_synced)
+        if (records.length > 0) {
+            // handled after any export already queued on the worker
+            export_worker.postMessage({ type: "append", records: records })
+            export_synced += records.length
+        }
+    }
+
+    const discard_export_worker = () => {
+        if (export_worker) {
+            export_worker.terminate()
+            export_worker = false
+        }
+    }
+
+    jQuery("#export-button").on("click", () => {
+        let [start, end] = get_selected_range()
+        let filename = `${data.reference.name}_${start}_${end}.fasta`
+        let request = { type: "export", start: start, end: end, remove_gaps: jQuery("#remove-gaps").is(":checked") }
+        let button = document.getElementById("export-button")
+        if (window.Worker) {
+            try {
+                let worker = get_export_worker()
+                button.disabled = true
+                worker.onmessage = (e) => {
+                    button.disabled = false
+                    download_to_file(e.data, filename)
+                }
+                worker.onerror = () => {
+                    button.disabled = false
+                    discard_export_worker()
+                    download_to_file(build_fasta_blob(export_records(), request), filename)
+                }
+                worker.postMessage(request)
+                return
+            } catch (err) {
+                // workers can be blocked for pages opened from disk
+                button.disabled = false
+                discard_export_worker()
+            }
+        }
+        download_to_file(build_fasta_blob(export_records(), request), filename)
+    })
+
+    jQuery("#remove-gaps").on("change", () => {
+        draw_sequences()
+    })
+
+    jQuery("#annotation-type").on("change", () => {
+        update_annotation_trace(true)
+    })
+
+    jQuery("#window-size").on("change", () => {
+        selected_window = parseInt(document.getElementById("window-size").value)
+        for (const strain_data of Object.values(data.queries)) {
+            set_query_window(strain_data, selected_window)
+        }
+        // redraw every ANI trace at the current zoom
+        for (const trace of grid_traces) {
+            if (trace.name == "significant") {
+                trace.resolution = []
+            }
+        }
+        update_resolution()
+    })
+
+    jQuery(document).ready(async function () {
+        await load_data()
+        selected_window = data.window
+        if (data.windows && data.windows.length > 1) {
+            document.getElementById("window-select").classList.remove("d-none")
+            let select = document.getElementById("window-size")
+            for (const size of data.windows) {
+                let opt = document.createElement("option")
+                opt.value = size
+                opt.innerHTML = size
+                if (size == data.window) {
+                    opt.selected = true
+                }
+                select.appendChild(opt)
+            }
+        }
+        if (data.gard) {
+            document.getElementById("iteration-number").innerHTML = Object.keys(data.gard.improvements).length - 1
+            await load_trees(Object.keys(data.gard.improvements).length - 1)
+            selected_trees = get_trees(Object.keys(data.gard.improvements).length - 1)
+        }
+        if (data.gff && Object.keys(data.gff).length > 0) {
+            // show the select
+            document.getElementById("annotation-select").classList.remove("d-none")
+            let select = document.getElementById("annotation-type")
+            // populate the select
+            for (const atype of Object.keys(data.gff)) {
+                let opt = document.createElement("option")
+                opt.value = atype
+                opt.innerHTML = atype
+                if (atype == "gene") {
+                    opt.selected = true
+                }
+                select.appendChild(opt)
+            }
+        }
+        update_details(data.reference.name, data.reference.seq.length, data.meta.cli, data.meta.dir, data.meta.container, data.meta.alignment)
+        build_grid_plots().then(() => {
+            if (data.gard) {
+                build_dendrograms().then(() => {
+                    build_gard_plot().then(() => {
+                        handle_dendrogram_click(0, data.gard.improvements[Object.keys(data.gard.improvements).length - 1].breakpoints[0][0], scroll = false)
+                    })
+                })
+            }
+        })
+        init_sequences()
+        jQuery('[data-toggle="tooltip"]').tooltip()
+        toggle_blast_button()
+        // split reports draw the reference first, then add queries as loaded
+        if (data.shards) {
+            await load_query_shards()
+        }
+    })
+</script>
+</html>
+"""
+
+CDN_DEPENDENCIES = """    <script type="text/javascript" src="https://code.jquery.com/jquery-3.3.1.js"></script>
+    <script type="text/javascript" src="https://d3js.org/d3.v3.min.js"></script>
+
+    <script type="text/javascript" src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+    <link href="https://fonts.googleapis.com/css2?family=Righteous&display=swap" rel="stylesheet">
+
+    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.0.0-beta1/dist/css/bootstrap.min.css" rel="stylesheet"
+        integrity="sha384-giJF6kkoqNQ00vy+HMDP7azOuL0xtbfIcaT9wjKHr8RbDVddVHyTfAAsrekwKmP1" crossorigin="anonymous">
+    <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.0.0-beta1/dist/js/bootstrap.bundle.min.js"
+        integrity="sha384-ygbV9kiqUc6oa4msXn9868pTtWMgiQaeYH7/t7LECLbyPA2x65Kgf80OJFdroafW"
+        crossorigin="anonymous"></script>"""
+
+# pinned copies of the report dependencies, inlined by --offline; d3 is taken
+# from the full plotly.js bundle, which ships the same v3 release
+VENDORED_DEPENDENCIES = [
+    ("jquery-3.3.1.min.js", "script"),
+    ("plotly-1.58.4.min.js", "script"),
+    ("bootstrap-5.0.0-beta1.min.css", "style"),
+    ("bootstrap-5.0.0-beta1.bundle.min.js", "script"),
+]
+
+# A - green, C - blue, G - yellow, T - red
+nuc_map = {
+    "a": 0,
+    "c": 1,
+    "g": 2,
+    "t": 3,
+    "u": 3,
+    "A": 0,
+    "C": 1,
+    "G": 2,
+    "T": 3,
+    "-": 4,
+    "N": 4,
+    "n": 4,
+}
+# code used for bases absent from nuc_map; emitted as "" in the report
+UNMAPPED = 255
+# downsampled identity levels for the ANI plot; the report switches to full
+# resolution once the visible window needs fewer than PYRAMID_POINTS
+PYRAMID_FACTOR = 4
+PYRAMID_POINTS = 2000
+NUC_CODES = len(set(nuc_map.values()))
+# features per interval index block of each gff feature type
+GFF_BLOCK = 32
+# bumped when the cached query tracks change
+CACHE_VERSION = 2
+if np is not None:
+    nuc_lut = np.full(256, UNMAPPED, dtype=np.uint8)
+    for base, code in nuc_map.items():
+        nuc_lut[ord(base)] = code
+
+
+def gzopen(f):
+    if f.endswith(".gz"):
+        return gzip.open(f, "rt")
+    else:
+        return open(f)
+
+
+# rna input is reported as dna
+u_to_t = str.maketrans("uU", "tT")
+
+
+def read_fasta(fh):
+    name = None
+    seq = []
+    for line in fh:
+        if line.startswith(">"):
+            if name is not None:
+                yield name, "".join(seq)
+            name = line[1:].strip()
+            seq = []
+        else:
+            # translate each line so the joined sequence is only built once
+            seq.append(line.strip().translate(u_to_t))
+    if name is not None:
+        yield name, "".join(seq)
+
+
+def iter_fasta(filepath):
+    with gzopen(filepath) as fh:
+        yield from read_fasta(fh)
+
+
+def parse_alignments(fasta):
+    records = iter_fasta(fasta)
+    name, seq = next(records)
+    reference = dict(name=name, seq=seq)
+    if np is not None:
+        reference["msa"] = codes_to_list(nuc_lut[alignment_matrix([seq])[0]])
+    else:
+        msa = list()
+        for b in seq:
+            try:
+                msa.append(nuc_map[b])
+            except KeyError:
+                msa.append("")
+        reference["msa"] = msa
+    coloured = [i for i, code in enumerate(reference["msa"]) if code != ""]
+    reference["msa_pyramid"] = msa_pyramid(
+        coloured, [reference["msa"][i] for i in coloured], len(seq)
+    )
+    # queries are read lazily as they are processed
+    queries = (dict(name=name, seq=seq) for name, seq in records)
+    return reference, queries
+
+
+def alignment_matrix(seqs):
+    # rows are sequences, columns are alignment sites
+    matrix = np.empty((len(seqs), len(seqs[0])), dtype=np.uint8)
+    for i, seq in enumerate(seqs):
+        row = np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)
+        assert len(row) == matrix.shape[1]
+        matrix[i] = row
+    return matrix
+
+
+def codes_to_list(codes):
+    z = codes.astype(object)
+    z[codes == UNMAPPED] = ""
+    return z.tolist()
+
+
+def rolling_identity(cumulative, window):
+    # cumulative mismatch counts are shared by every window size
+    size = min(window, len(cumulative) - 1)
+    return [
+        max((window - (cumulative[i + size] - cumulative[i])) / window, 0)
+        for i in range(len(cumulative) - size)
+    ]
+
+
+def pyramid_bins(length):
+    # bin sizes coarsening by PYRAMID_FACTOR per level until the whole track
+    # fits in PYRAMID_POINTS
+    size = PYRAMID_FACTOR
+    while length > PYRAMID_POINTS * (size // PYRAMID_FACTOR):
+        yield size
+        size *= PYRAMID_FACTOR
+
+
+def identity_pyramid(identities):
+    # min/max/mean of each bin
+    levels = list()
+    for size in pyramid_bins(len(identities)):
+        if np is not None:
+            values = np.asarray(identities, dtype=np.float64)
+            starts = np.arange(0, len(values), size)
+            counts = np.diff(np.append(starts, len(values)))
+            # zero padded so each bin is summed left to right like below;
+            # cumsum, unlike sum, does not reorder the additions
+            padded = np.zeros(len(starts) * size)
+            padded[:len(values)] = values
+            sums = np.cumsum(padded.reshape(len(starts), size), axis=1)[:, -1]
+            level = dict(
+                bin=size,
+                min=np.minimum.reduceat(values, starts).tolist(),
+                max=np.maximum.reduceat(values, starts).tolist(),
+                mean=(np.rint(sums / counts * 1e6) / 1e6).tolist(),
+            )
+        else:
+            bins = [identities[i:i + size] for i in range(0, len(identities), size)]
+            level = dict(
+                bin=size,
+                min=[min(b) for b in bins],
+                max=[max(b) for b in bins],
+                # rounded to 6 decimals the way np.rint does it above
+                mean=[round(list(accumulate(b))[-1] / len(b) * 1e6) / 1e6 for b in bins],
+            )
+        levels.append(level)
+    return levels
+
+
+def majority_bins(positions, codes, size):
+    # most common colour code of each bin holding coloured positions; ties
+    # go to the lowest code
+    if np is not None:
+        positions = np.asarray(positions, dtype=np.int64)
+        codes = np.asarray(codes, dtype=np.uint8)
+        if not len(positions):
+            return [], []
+        bins = positions // size
+        counts = np.stack([
+            np.bincount(bins[codes == code], minlength=bins[-1] + 1) for code in range(NUC_CODES)
+        ])
+        occupied = np.flatnonzero(counts.sum(axis=0))
+        return occupied.tolist(), counts[:, occupied].argmax(axis=0).tolist()
+
+    bins = dict()
+    for position, code in zip(positions, codes):
+        bins.setdefault(position // size, Counter())[code] += 1
+    majority = [min(counter, key=lambda c: (-counter[c], c)) for counter in bins.values()]
+    return list(bins), majority
+
+
+def msa_pyramid(positions, codes, length):
+    # sparse binned colour codes; positions are bin indexes
+    levels = list()
+    for size in pyramid_bins(length):
+        bin_positions, bin_codes = majority_bins(positions, codes, size)
+        levels.append(dict(bin=size, positions=bin_positions, codes=bin_codes))
+    return levels
+
+
+def process_queries_vectorized(refseq, query_seqs, window, windows=()):
+    query_vals = dict()
+    query_seqs = list(query_seqs)
+    if not query_seqs:
+        return query_vals
+    matrix = alignment_matrix([refseq] + [query["seq"] for query in query_seqs])
+    mismatches = matrix[1:] != matrix[0]
+    # matching positions are left uncoloured
+    codes = np.where(mismatches, nuc_lut[matrix[1:]], UNMAPPED)
+    cumulative = np.zeros(matrix.shape[1] + 1, dtype=np.int64)
+    for query, query_mismatches, query_codes in zip(query_seqs, mismatches, codes):
+        np.cumsum(query_mismatches, out=cumulative[1:])
+        tracks = dict()
+        for w in [window, *windows]:
+            size = min(w, matrix.shape[1])
+            counts = cumulative[size:] - cumulative[:-size]
+            identities = np.maximum((w - counts) / w, 0).tolist()
+            tracks[w] = dict(identity=identities, pyramid=identity_pyramid(identities))
+        positions = np.flatnonzero(query_codes != UNMAPPED)
+        track = tracks.pop(window)
+        query_vals[query["name"]] = dict(
+            identity=track["identity"],
+            pyramid=track["pyramid"],
+            positions=positions.tolist(),
+            codes=query_codes[positions].tolist(),
+            msa_pyramid=msa_pyramid(positions, query_codes[positions], len(refseq)),
+            seq=query["seq"],
+        )
+        if windows:
+            query_vals[query["name"]]["windows"] = {str(w): track for w, track in tracks.items()}
+    return query_vals
+
+
+def process_queries(refseq, query_seqs, window, windows=()):
+    if np is not None:
+        return process_queries_vectorized(refseq, query_seqs, window, windows)
+
+    query_vals = dict()
+    for query in query_seqs:
+        mismatches = list()
+        # only coloured mismatches are kept for the msa of the query
+        positions = list()
+        codes = list()
+        for i, (rbase, qbase) in enumerate(zip(refseq, query["seq"])):
+            if rbase == qbase:
+                mismatches.append(0)
+            else:
+                mismatches.append(1)
+                # ambiguous bases are left uncoloured
+                if qbase in nuc_map:
+                    positions.append(i)
+                    codes.append(nuc_map[qbase])
+
+        assert len(mismatches) == len(refseq)
+
+        cumulative = list(accumulate(mismatches, initial=0))
+        tracks = dict()
+        for w in [window, *windows]:
+            identities = rolling_identity(cumulative, w)
+            tracks[w] = dict(identity=identities, pyramid=identity_pyramid(identities))
+
+        track = tracks.pop(window)
+        query_vals[query["name"]] = dict(
+            identity=track["identity"],
+            pyramid=track["pyramid"],
+            positions=positions,
+            codes=codes,
+            msa_pyramid=msa_pyramid(positions, codes, len(refseq)),
+            seq=query["seq"],
+        )
+        if windows:
+            query_vals[query["name"]]["windows"] = {str(w): track for w, track in tracks.items()}
+    return query_vals
+
+
+def worker_pool(cpus):
+    # fork so workers inherit the module state
+    return multiprocessing.get_context("fork").Pool(cpus)
+
+
+def process_queries_parallel(refseq, query_seqs, window, cpus, pool=None, windows=()):
+    if cpus < 2:
+        return process_queries(refseq, query_seqs, window, windows)
+
+    query_seqs = list(query_seqs)
+    if len(query_seqs) < 2:
+        return process_queries(refseq, query_seqs, window, windows)
+
+    # several shards per worker to even out uneven query lengths
+    shard_size = -(-len(query_seqs) // (cpus * 4))
+    shards = [query_seqs[i:i + shard_size] for i in range(0, len(query_seqs), shard_size)]
+    args = [(refseq, shard, window, windows) for shard in shards]
+    if pool is None:
+        with worker_pool(cpus) as pool:
+            results = pool.starmap(process_queries, args)
+    else:
+        # a caller's pool is reused across reports
+        results = pool.starmap(process_queries, args)
+
+    # pool.starmap preserves shard order, matching the serial output
+    query_vals = dict()
+    for result in results:
+        query_vals.update(result)
+    return query_vals
+
+
+def cache_key(ref_digest, seq, window, windows=()):
+    # content addressed; query names are not part of the key
+    query_digest = hashlib.sha256(seq.encode()).hexdigest()
+    windows = ",".join(str(w) for w in [window, *windows])
+    key = f"{CACHE_VERSION}:{PYRAMID_FACTOR}:{PYRAMID_POINTS}:{windows}:{ref_digest}:{query_digest}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def pack_cache_entry(query):
+    # pyramids as json followed by the position, identity and code arrays
+    windows = query.get("windows", dict())
+    identities = [query["identity"]] + [track["identity"] for track in windows.values()]
+    header = json.dumps(
+        dict(
+            pyramid=query["pyramid"],
+            msa_pyramid=query["msa_pyramid"],
+            windows={w: track["pyramid"] for w, track in windows.items()},
+            sizes=[len(query["positions"])] + [len(identity) for identity in identities],
+        )
+    ).encode()
+    return zlib.compress(
+        len(header).to_bytes(4, "little")
+        + header
+        + array("I", query["positions"]).tobytes()
+        + b"".join(array("d", identity).tobytes() for identity in identities)
+        + bytes(query["codes"])
+    )
+
+
+def unpack_cache_entry(packed):
+    packed = zlib.decompress(packed)
+    offset = 4 + int.from_bytes(packed[:4], "little")
+    entry = json.loads(packed[4:offset])
+    n_positions, *n_identities = entry.pop("sizes")
+    positions = array("I")
+    positions.frombytes(packed[offset:offset + n_positions * positions.itemsize])
+    offset += n_positions * positions.itemsize
+    identities = []
+    for n_identity in n_identities:
+        identity = array("d")
+        identity.frombytes(packed[offset:offset + n_identity * identity.itemsize])
+        offset += n_identity * identity.itemsize
+        identities.append(identity.tolist())
+    entry["identity"] = identities[0]
+    entry["positions"] = positions.tolist()
+    entry["codes"] = list(packed[offset:])
+    windows = entry.pop("windows")
+    if windows:
+        entry["windows"] = {
+            w: dict(identity=identity, pyramid=pyramid)
+            for (w, pyramid), identity in zip(windows.items(), identities[1:])
+        }
+    return entry
+
+
+def read_cache_entry(cache_dir, key):
+    path = os.path.join(cache_dir, f"{key}.idq")
+    try:
+        with open(path, "rb") as fh:
+            entry = unpack_cache_entry(fh.read())
+    except (OSError, ValueError, zlib.error):
+        return None
+    # modification times order entries for eviction; a read-only cache, or
+    # an entry evicted by a concurrent run, is still a hit
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return entry
+
+
+def write_cache_entry(cache_dir, key, query):
+    path = os.path.join(cache_dir, f"{key}.idq")
+    # replaced atomically so concurrent runs never read partial entries
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(pack_cache_entry(query))
+    os.replace(tmp, path)
+
+
+def evict_cache(cache_dir, max_bytes):
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".idq"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    # least recently used first
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def process_queries_cached(refseq, query_seqs, window, cpus, cache_dir, cache_size, pool=None, windows=()):
+    # cache_size in bytes
+    os.makedirs(cache_dir, exist_ok=True)
+    ref_digest = hashlib.sha256(refseq.encode()).hexdigest()
+    names = []
+    keys = dict()
+    cached = dict()
+    misses = []
+    for query in query_seqs:
+        key = cache_key(ref_digest, query["seq"], window, windows)
+        entry = read_cache_entry(cache_dir, key)
+        names.append(query["name"])
+        if entry is None:
+            keys[query["name"]] = key
+            misses.append(query)
+        else:
+            entry["seq"] = query["seq"]
+            cached[query["name"]] = entry
+
+    computed = process_queries_parallel(refseq, misses, window, cpus, pool, windows)
+    for name, query in computed.items():
+        write_cache_entry(cache_dir, keys[name], query)
+    evict_cache(cache_dir, cache_size)
+
+    # alignment order, as without the cache
+    cached.update(computed)
+    return {name: cached[name] for name in names}
+
+
+def pack_codes(codes):
+    packed = bytes(UNMAPPED if code == "" else code for code in codes)
+    return base64.b64encode(packed).decode("ascii")
+
+
+def pack_identity(identities):
+    # quantised to uint16, little-endian to match the browser's Uint16Array
+    if np is not None:
+        packed = np.rint(np.asarray(identities) * 65535).astype("<u2").tobytes()
+    else:
+        quantised = array("H", (round(i * 65535) for i in identities))
+        if sys.byteorder == "big":
+            quantised.byteswap()
+        packed = quantised.tobytes()
+    return base64.b64encode(packed).decode("ascii")
+
+
+def pack_positions(positions):
+    packed = array("I", positions)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return base64.b64encode(packed.tobytes()).decode("ascii")
+
+
+def compact_msa_pyramid(levels):
+    for level in levels:
+        level["positions"] = pack_positions(level["positions"])
+        level["codes"] = pack_codes(level["codes"])
+
+
+def compact_identity(track):
+    track["identity"] = pack_identity(track["identity"])
+    for level in track["pyramid"]:
+        for stat in ["min", "max", "mean"]:
+            level[stat] = pack_identity(level[stat])
+
+
+def compact_tracks(reference, queries):
+    reference["msa"] = pack_codes(reference["msa"])
+    compact_msa_pyramid(reference["msa_pyramid"])
+    for query in queries.values():
+        compact_identity(query)
+        for track in query.get("windows", dict()).values():
+            compact_identity(track)
+        query["positions"] = pack_positions(query["positions"])
+        query["codes"] = pack_codes(query["codes"])
+        compact_msa_pyramid(query["msa_pyramid"])
+
+
+def nan_to_none(obj):
+    if isinstance(obj, float) and obj != obj:
+        return None
+    if isinstance(obj, dict):
+        return {k: nan_to_none(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [nan_to_none(v) for v in obj]
+    return obj
+
+
+def dumps(obj):
+    # NaN is not valid JSON; only walk values that actually contain it
+    try:
+        return json.dumps(obj, allow_nan=False)
+    except ValueError:
+        return json.dumps(nan_to_none(obj))
+
+
+def json_chunks(data):
+    # queries are encoded one at a time so only one is held as a string
+    yield "{"
+    for i, (key, value) in enumerate(data.items()):
+        if i:
+            yield ", "
+        yield f"{json.dumps(key)}: "
+        if key == "queries":
+            yield "{"
+            for j, (name, query) in enumerate(value.items()):
+                if j:
+                    yield ", "
+                yield f"{json.dumps(name)}: {dumps(query)}"
+            yield "}"
+        else:
+            yield dumps(value)
+    yield "}"
+
+
+def gzip_base64_chunks(chunks):
+    # gzip container (wbits=31) so the browser's DecompressionStream can read it
+    compressor = zlib.compressobj(wbits=31)
+    pending = b""
+    for chunk in chunks:
+        pending += compressor.compress(chunk.encode("utf-8"))
+        # base64 is streamed in whole 3 byte groups
+        cut = len(pending) - len(pending) % 3
+        if cut:
+            yield base64.b64encode(pending[:cut]).decode("ascii")
+            pending = pending[cut:]
+    pending += compressor.flush()
+    yield base64.b64encode(pending).decode("ascii")
+
+
+def vendored_dependencies(asset_dir):
+    tags = []
+    for filename, kind in VENDORED_DEPENDENCIES:
+        with open(os.path.join(asset_dir, filename), encoding="utf-8") as fh:
+            content = fh.read()
+        if kind == "script":
+            # keep library strings from closing the inline script early
+            content = content.replace("</script", "<\\/script")
+            tags.append(f'    <script type="text/javascript">\n{content}\n    </script>')
+        else:
+            tags.append(f'    <style type="text/css">\n{content}\n    </style>')
+    # the full plotly.js bundle carries the d3 v3 used by the tree panel
+    tags.append('    <script type="text/javascript">\n    var d3 = window.d3 || Plotly.d3\n    </script>')
+    return "\n".join(tags)
+
+
+def write_report(output, data, compress=False, gzip_report=False, dependencies=CDN_DEPENDENCIES):
+    head, _, tail = TEMPLATE.partition("{{data}}")
+    head = head.replace("{{dependencies}}", dependencies)
+    if gzip_report:
+        fh = gzip.open(f"{output}.gz", "wt")
+    else:
+        fh = open(output, "w")
+    with fh:
+        fh.write(head)
+        if compress:
+            fh.write('{"compressed": "')
+            for chunk in gzip_base64_chunks(json_chunks(data)):
+                fh.write(chunk)
+            fh.write('"}')
+        else:
+            for chunk in json_chunks(data):
+                fh.write(chunk)
+        fh.write(tail + "\n")
+
+
+def write_shard(path, key, payload):
+    with open(path, "w") as fh:
+        fh.write(f"idplot_shard({json.dumps(key)}, {dumps(payload)})\n")
+
+
+def write_split_report(outdir, data, compress=False, gzip_report=False, dependencies=CDN_DEPENDENCIES):
+    # index.html holds a manifest; queries and the trees of each GARD
+    # iteration are script shards the report loads after first paint
+    if gzip_report:
+        # browsers do not open index.html.gz from disk
+        raise ValueError("gzip_report cannot be combined with split_report")
+    os.makedirs(os.path.join(outdir, "shards"), exist_ok=True)
+    shards = dict(queries=[], trees=dict())
+    for i, (name, query) in enumerate(data["queries"].items()):
+        key = f"query_{i}"
+        path = f"shards/{key}.js"
+        write_shard(os.path.join(outdir, path), key, query)
+        shards["queries"].append([name, key, path])
+
+    if data["gard"] and data["trees"]:
+        length = len(data["reference"]["seq"])
+        for iteration, improvement in data["gard"]["improvements"].items():
+            key = f"trees_{iteration}"
+            path = f"shards/{key}.js"
+            start = 0
+            regions = list()
+            for bp in improvement["breakpoints"]:
+                regions.append(f"{start}_{bp[0]}")
+                start = bp[0] + 1
+            regions.append(f"{start}_{length}")
+            trees = {region: data["trees"][region] for region in regions if region in data["trees"]}
+            write_shard(os.path.join(outdir, path), key, trees)
+            shards["trees"][iteration] = [key, path]
+
+    manifest = dict(data, queries=dict(), trees=dict() if data["trees"] else data["trees"])
+    manifest["shards"] = shards
+    write_report(os.path.join(outdir, "index.html"), manifest, compress, gzip_report, dependencies)
+
+
+def parse_alignment_details(filepath):
+    # strategy, command, sequences, residues and seconds of the mafft step
+    if not filepath:
+        return False
+
+    with open(filepath) as fh:
+        header = fh.readline().rstrip("\n").split("\t")
+        return dict(zip(header, fh.readline().rstrip("\n").split("\t")))
+
+
+def parse_gard(filepath):
+    if not filepath:
+        return False
+
+    with open(filepath) as fh:
+        jdata = json.load(fh)
+        # small amount of bs
+        jdata.pop('analysis', None)
+        # large amount of bs
+        jdata.pop('siteBreakPointSupport', None)
+        return jdata
+
+
+def parse_trees(filepaths):
+    if not filepaths:
+        return False
+
+    if isinstance(filepaths, str):
+        filepaths = filepaths.split(" ")
+    t = dict()
+    for f in filepaths:
+        _, start, end = f.rpartition(".")[0].rsplit("_", 2)
+        with open(f) as fh:
+            newick = fh.readline().strip()
+            t[f"{start}_{end}"] = newick
+    return t
+
+
+def gapped_coordinates(refseq):
+    # alignment column of every ungapped reference base
+    if np is not None:
+        return np.flatnonzero(alignment_matrix([refseq])[0] != ord("-")).tolist()
+    return [i for i, b in enumerate(refseq) if b != "-"]
+
+
+def parse_gff(filepath, refseq):
+    if not filepath:
+        return False
+    columns = gapped_coordinates(refseq)
+    gff_data = defaultdict(list)
+    with gzopen(filepath) as fh:
+        for line in fh:
+            if line.startswith("#"):
+                continue
+
+            toks = line.strip().split("\t")
+            # make sure we ignore fasta lines when present
+            if len(toks) < 9:
+                continue
+            # 1-based reference coordinates to alignment columns; features
+            # outside the reference cannot be placed and are skipped
+            start, end = int(toks[3]), int(toks[4])
+            if not 1 <= start <= len(columns) or not 1 <= end <= len(columns):
+                continue
+            gff_data[toks[2]].append([columns[start - 1], columns[end - 1], toks[8]])
+
+    # features sorted by start with the furthest end of each block of
+    # GFF_BLOCK features, so the report can skip blocks outside its view
+    gff_index = dict()
+    for feature_type, features in gff_data.items():
+        features.sort(key=lambda feature: (feature[0], feature[1]))
+        max_end = [
+            max(feature[1] for feature in features[i:i + GFF_BLOCK])
+            for i in range(0, len(features), GFF_BLOCK)
+        ]
+        gff_index[feature_type] = dict(features=features, max_end=max_end)
+    return gff_index
+
+
+def build_data(alignments, gard=False, trees=False, gff=False, window=500, cpus=1, compact=False, meta=None, pool=None,
+               cache_dir=False, cache_size=2000, windows=()):
+    # cache_size in MB; windows are extra identity window sizes
+    windows = [w for w in dict.fromkeys(windows) if w != window]
+    reference, queries = parse_alignments(alignments)
+    if cache_dir:
+        queries = process_queries_cached(
+            reference["seq"], queries, window, cpus, cache_dir, cache_size * 1000000, pool, windows
+        )
+    else:
+        queries = process_queries_parallel(reference["seq"], queries, window, cpus, pool, windows)
+    gard_results = parse_gard(gard)
+    tree_results = parse_trees(trees)
+    gff_results = parse_gff(gff, reference["seq"])
+    if compact:
+        compact_tracks(reference, queries)
+    return {
+        "reference": reference,
+        "queries": queries,
+        "gard": gard_results,
+        "trees": tree_results,
+        "gff": gff_results,
+        "window": window,
+        "windows": sorted([window, *windows]),
+        "pyramid_points": PYRAMID_POINTS,
+        "gff_block": GFF_BLOCK,
+        "encoding": "compact" if compact else "json",
+        "meta": meta or {"cli": "", "dir": "", "container": ""},
+    }
+
+
+def render_report(alignments, output="idplot.html", gard=False, trees=False, gff=False,
+                  window=500, cpus=1, compact=False, compress=False,
+                  gzip_report=False, split_report=False, dependencies=CDN_DEPENDENCIES,
+                  meta=None, pool=None, cache_dir=False, cache_size=2000, windows=()):
+    data = build_data(
+        alignments, gard, trees, gff, window, cpus, compact, meta, pool, cache_dir, cache_size, windows
+    )
+    # returns the path written
+    if split_report:
+        outdir = output.rpartition(".")[0]
+        write_split_report(outdir, data, compress, gzip_report, dependencies)
+        return outdir
+    write_report(output, data, compress, gzip_report, dependencies)
+    return f"{output}.gz" if gzip_report else output
+
+
+def read_manifest(filepath):
+    # tab-delimited with a header; only the msa column is required
+    with open(filepath) as fh:
+        header = fh.readline().rstrip("\n").split("\t")
+        for line in fh:
+            if not line.strip():
+                continue
+            row = dict(zip(header, line.rstrip("\n").split("\t")))
+            yield {k: v for k, v in row.items() if v}
+
+
+def report_name(alignments):
+    name = os.path.basename(alignments)
+    for suffix in [".gz", ".fasta", ".fa", ".msa"]:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return f"{name}.html"
+
+
+def main(argv=None):
+    import argparse
+
+    p = argparse.ArgumentParser(
+        description="Render idplot reports. Several alignments, or a --manifest, are rendered in one process."
+    )
+    p.add_argument("msa", nargs="*", help="alignments; the first sequence of each is the reference")
+    p.add_argument("--manifest", help="tab-delimited file with columns msa, and optionally output, gard, trees (space separated) and gff")
+    p.add_argument("--gard", help="GARD json results")
+    p.add_argument("--trees", nargs="+", help="newick trees of GARD regions")
+    p.add_argument("--gff", help="reference annotation")
+    p.add_argument("--output", default="idplot.html", help="report path when rendering one alignment")
+    p.add_argument("--outdir", default=".", help="report directory when rendering several alignments")
+    p.add_argument("--window", type=int, default=500)
+    p.add_argument("--windows", type=int, nargs="+", default=[], help="extra window sizes the report can switch to")
+    p.add_argument("--cpus", type=int, default=1)
+    p.add_argument("--compact", action="store_true")
+    p.add_argument("--compress", action="store_true")
+    p.add_argument("--gzip-report", action="store_true")
+    p.add_argument("--split-report", action="store_true")
+    p.add_argument("--offline", action="store_true")
+    p.add_argument("--assets", default="/opt/idplot/assets")
+    p.add_argument("--cache-dir", help="reuse query tracks computed by earlier runs from this directory")
+    p.add_argument("--cache-size", type=int, default=2000, help="MB kept in --cache-dir")
+    p.add_argument("--cli", default="", help="command line shown in the run details")
+    p.add_argument("--launch-dir", default="", help="launch directory shown in the run details")
+    p.add_argument("--container", default="", help="container shown in the run details")
+    p.add_argument("--alignment-details", help="alignment strategy written by the mafft process")
+    args = p.parse_args(argv)
+
+    defaults = dict(gard=args.gard, trees=args.trees, gff=args.gff)
+    if args.manifest:
+        reports = list(read_manifest(args.manifest))
+    else:
+        reports = [dict(msa=msa) for msa in args.msa]
+    if not reports:
+        p.error("no alignments given")
+    if args.split_report and args.gzip_report:
+        p.error("--gzip-report cannot be combined with --split-report")
+    if len(reports) > 1 and (args.gard or args.trees):
+        p.error("--gard and --trees are per alignment; use --manifest")
+    for report in reports:
+        if "trees" in report:
+            report["trees"] = report["trees"].split(" ")
+        if "output" not in report:
+            report["output"] = args.output if len(reports) == 1 else os.path.join(args.outdir, report_name(report["msa"]))
+        for k, v in defaults.items():
+            report.setdefault(k, v)
+
+    # the template and dependencies are loaded once and the worker pool is
+    # shared by every report
+    dependencies = vendored_dependencies(args.assets) if args.offline else CDN_DEPENDENCIES
+    meta = {
+        "cli": args.cli,
+        "dir": args.launch_dir,
+        "container": args.container,
+        "alignment": parse_alignment_details(args.alignment_details),
+    }
+    if len(reports) > 1:
+        os.makedirs(args.outdir, exist_ok=True)
+    pool = worker_pool(args.cpus) if args.cpus > 1 else None
+    try:
+        for report in reports:
+            written = render_report(
+                report["msa"],
+                report["output"],
+                gard=report["gard"] or False,
+                trees=report["trees"] or False,
+                gff=report["gff"] or False,
+                window=args.window,
+                cpus=args.cpus,
+                compact=args.compact,
+                compress=args.compress,
+                gzip_report=args.gzip_report,
+                split_report=args.split_report,
+                dependencies=dependencies,
+                meta=meta,
+                pool=pool,
+                cache_dir=args.cache_dir or False,
+                cache_size=args.cache_size,
+                windows=args.windows,
+            )
+            print(written, file=sys.stderr)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,13 @@ if (params.help) {
 
     --alignment  Pre-aligned sequences where the first sequence is your root.
 
+    OR
+
+    --add_to     A previous *.msa.fasta to add `--fasta` sequences to. Only
+                 sequences not yet in the alignment are aligned, keeping
+                 its length and reference coordinates (mafft --add
+                 --keeplength), so --cache_dir results remain valid.
+
     options
     -------
     --outdir     Base results directory for output.
@@ -26,6 +33,9 @@ if (params.help) {
     --window     The sliding window size across the reference genome upon
                  which to calculate similarity.
                  Default: 500
+    --windows    Comma separated window sizes, in addition to --window,
+                 that the report can switch between, e.g. 100,1000.
+                 Default: false
     --gard       Run GARD for breakpoint detection.
                  Default: false
     --gff        Reference annotation file in .gff or .gff3 format.
@@ -34,20 +44,73 @@ if (params.help) {
                  Default: false
     --cpus       Threads for multi-threaded processes.
                  Default: 1
+    --mafft_strategy
+                 Alignment strategy: L-INS-i (--globalpair --maxiterate
+                 1000), FFT-NS-i (--retree 2 --maxiterate 2), reference
+                 (queries aligned to the reference with --addfragments
+                 --keeplength) or auto. auto uses L-INS-i up to
+                 --mafft_small sequences and --mafft_small_residues,
+                 FFT-NS-i up to --mafft_large sequences and
+                 --mafft_large_residues, and reference beyond. The
+                 strategy and its runtime are shown in the report's
+                 Run details.
+                 Default: auto (50, 2000000, 1000, 50000000)
+    --compact    Encode report tracks as base64 typed arrays to reduce
+                 report size for large query sets.
+                 Default: false
+    --compress   Gzip the report data within the HTML. The browser
+                 decompresses it when the report is opened.
+                 Default: false
+    --gzip_report
+                 Write the report as idplot.html.gz.
+                 Default: false
+    --split_report
+                 Write the report as an idplot/ directory where index.html
+                 loads per-query and per-GARD iteration data shards after
+                 first paint. Open from disk or serve the directory.
+                 Default: false
+    --offline    Embed pinned, minified copies of jQuery, d3, Plotly and
+                 Bootstrap in the report so it opens without network
+                 access.
+                 Default: false
+    --assets     Directory holding the copies embedded by --offline.
+                 Default: /opt/idplot/assets (within the container)
+    --cache_dir  Directory of query results reused by later runs, so only
+                 new or changed queries are processed. Entries are keyed
+                 by the reference and query sequences and the window. The
+                 directory must be visible to the task, e.g. mounted into
+                 the container.
+                 Default: false
+    --cache_size Size in MB kept in --cache_dir. The least recently used
+                 entries are removed first.
+                 Default: 2000
     -----------------------------------------------------------------------
     """.stripIndent()
     exit 0
 }
+if( params.split_report && params.gzip_report ) { exit 1, "--gzip_report cannot be combined with --split_report" }
 // required arguments
 params.reference = false
 params.fasta = false
 params.alignment = false
+params.add_to = false
+previous_alignment = false
+add_ch = Channel.empty()
 if( params.alignment ) {
     Channel
         .fromPath(params.alignment, checkIfExists: true)
         .into { alignment_gard_ch; alignment_json_ch; alignment_report_ch }
     mafft_ch = Channel.empty()
     reference = false
+} else if( params.add_to ) {
+    previous_alignment = file(params.add_to)
+    if( !previous_alignment.exists() ) { exit 1, "Alignment [${previous_alignment}] does not exist." }
+    if( !params.fasta ) { exit 1, "--fasta is not defined" }
+    Channel
+        .fromPath(params.fasta, checkIfExists: true)
+        .set { add_ch }
+    mafft_ch = Channel.empty()
+    reference = false
 } else {
     if( !params.reference ) { exit 1, "Neither --reference NOR --alignment are defined" }
     reference = file(params.reference)
@@ -70,21 +133,90 @@ process mafft {
 
     output:
     path("${reference.baseName}.msa.fasta") into (msa_gard_ch, msa_json_ch, msa_report_ch)
+    path("alignment.tsv") into mafft_details_ch
 
     when:
-    params.reference
+    params.reference && !params.alignment && !params.add_to
 
     script:
     """
     cat ${reference} > mafft_input.fasta
     cat ${query} >> mafft_input.fasta
-    mafft --auto --thread ${task.cpus} --maxiterate 1000 --globalpair mafft_input.fasta > ${reference.baseName}.msa.fasta
+    sequences=\$(grep -c '^>' mafft_input.fasta)
+    residues=\$(grep -v '^>' mafft_input.fasta | tr -d ' \\r\\n' | wc -c)
+    strategy=${params.mafft_strategy}
+    # iterative global refinement while it stays tractable, FFT-based
+    # progressive alignment for medium sets, and alignment of each query
+    # to the reference beyond that
+    if [ "\$strategy" = auto ]; then
+        if [ "\$sequences" -le ${params.mafft_small} ] && [ "\$residues" -le ${params.mafft_small_residues} ]; then
+            strategy=L-INS-i
+        elif [ "\$sequences" -le ${params.mafft_large} ] && [ "\$residues" -le ${params.mafft_large_residues} ]; then
+            strategy=FFT-NS-i
+        else
+            strategy=reference
+        fi
+    fi
+    case "\$strategy" in
+        L-INS-i)
+            command="mafft --auto --thread ${task.cpus} --maxiterate 1000 --globalpair mafft_input.fasta" ;;
+        FFT-NS-i)
+            command="mafft --thread ${task.cpus} --retree 2 --maxiterate 2 mafft_input.fasta" ;;
+        reference)
+            cat ${query} > mafft_queries.fasta
+            command="mafft --thread ${task.cpus} --6merpair --keeplength --addfragments mafft_queries.fasta ${reference}" ;;
+        *)
+            echo "unknown --mafft_strategy \$strategy" >&2
+            exit 1 ;;
+    esac
+    start=\$(date +%s)
+    \$command > ${reference.baseName}.msa.fasta
+    seconds=\$(( \$(date +%s) - start ))
+    printf "strategy\\tcommand\\tsequences\\tresidues\\tseconds\\n%s\\t%s\\t%s\\t%s\\t%s\\n" \\
+        "\$strategy" "\$command" "\$sequences" "\$residues" "\$seconds" > alignment.tsv
     """
 }
 
-msa_gard_input_ch = (params.reference ? msa_gard_ch : alignment_gard_ch)
-msa_json_input_ch = (params.reference ? msa_json_ch : alignment_json_ch)
-msa_report_input_ch = (params.reference ? msa_report_ch : alignment_report_ch)
+process mafft_add {
+    publishDir path: "${params.outdir}/", mode: "copy"
+    cpus params.cpus.toInteger()
+
+    input:
+    path(previous, stageAs: "previous.msa.fasta") from previous_alignment
+    path(query) from add_ch.collect()
+
+    output:
+    path("${previous_alignment.simpleName}.msa.fasta") into (add_gard_ch, add_json_ch, add_report_ch)
+    path("alignment.tsv") into add_details_ch
+
+    when:
+    params.add_to
+
+    script:
+    """
+    # only sequences missing from the previous alignment are added
+    grep '^>' ${previous} > aligned_names.txt
+    cat ${query} | awk 'NR == FNR {aligned[\$0]; next} /^>/ {keep = !(\$0 in aligned)} keep' aligned_names.txt - > new_queries.fasta
+    sequences=\$(grep -c '^>' new_queries.fasta || true)
+    residues=\$({ grep -v '^>' new_queries.fasta || true; } | tr -d ' \\r\\n' | wc -c)
+    command="mafft --add new_queries.fasta --keeplength --thread ${task.cpus} ${previous}"
+    start=\$(date +%s)
+    if [ -s new_queries.fasta ]; then
+        \$command > ${previous_alignment.simpleName}.msa.fasta
+    else
+        cp ${previous} ${previous_alignment.simpleName}.msa.fasta
+    fi
+    seconds=\$(( \$(date +%s) - start ))
+    printf "strategy\\tcommand\\tsequences\\tresidues\\tseconds\\n%s\\t%s\\t%s\\t%s\\t%s\\n" \\
+        "add" "\$command" "\$sequences" "\$residues" "\$seconds" > alignment.tsv
+    """
+}
+
+// same precedence as the inputs above: --alignment, then --add_to, then --reference
+msa_gard_input_ch = (params.alignment ? alignment_gard_ch : (params.add_to ? add_gard_ch : msa_gard_ch))
+msa_json_input_ch = (params.alignment ? alignment_json_ch : (params.add_to ? add_json_ch : msa_json_ch))
+msa_report_input_ch = (params.alignment ? alignment_report_ch : (params.add_to ? add_report_ch : msa_report_ch))
+alignment_details_ch = (params.alignment ? [""] : (params.add_to ? add_details_ch : mafft_details_ch))
 
 process gard {
     publishDir path: "${params.outdir}/gard/", mode: "copy"
@@ -145,15 +277,17 @@ tree_report_ch = (params.gard ? tree_output_ch : [""])
 
 process idplot {
     publishDir path: "${params.outdir}/", mode: "copy"
+    cpus params.cpus.toInteger()
 
     input:
     path(msa) from msa_report_input_ch
     file(json) from gard_report_ch
     file(trees) from tree_report_ch.collect()
     file(gff)
+    file(alignment_details) from alignment_details_ch
 
     output:
-    path("idplot.html")
+    path("idplot*")
 
     script:
     template "idplot.py"
@@ -1,7 +1,17 @@
 #!/usr/bin/env python
 
 import json
-from itertools import groupby
+import mmap
+import os
+import shutil
+import sys
+
+# the fasta readers are shared with bin/idplot.py, which nextflow places on the PATH
+idplot_path = shutil.which("idplot.py")
+if idplot_path is None:
+    sys.exit("jsontofasta: idplot.py was not found on the PATH; add the pipeline's bin/ directory to it")
+sys.path.insert(0, os.path.dirname(os.path.realpath(idplot_path)))
+from idplot import iter_fasta
 
 
 json_file = "$json"
@@ -11,14 +21,8 @@ output_prefix = alignments.rpartition(".msa.fasta")[0]
 regions = set()
 
 
-def read_fasta(fh):
-    for header, group in groupby(fh, lambda line: line[0] == ">"):
-        if header:
-            line = next(group)
-            name = line.strip()
-        else:
-            seq = "".join(line.strip() for line in group)
-            yield name, seq
+# rna input is reported as dna
+u_to_t_bytes = bytes.maketrans(b"uU", b"tT")
 
 
 with open(json_file) as fh:
@@ -33,17 +37,83 @@ with open(json_file) as fh:
             start = int(end) + 1
         regions.add(f"{start}_{total_len}")
 
-# grab the sequences
-seqs = dict()
-with open(alignments) as fh:
-    for name, seq in read_fasta(fh):
-        seqs[name] = seq.replace("u", "t").replace("U", "T")
-
-for region in regions:
-    filename = f"{output_prefix}_{region}.fa"
-    start, end = region.split("_")
-    start = int(start)
-    end = int(end)
-    with open(filename, "w") as fh:
-        for name, seq in seqs.items():
-            print(name, seq[start:end+1], sep="\\n", file=fh)
+def index_fasta(mm):
+    # .fai-style (name, offset, length, line bases, line width) per record;
+    # False when a record's lines are not of a fixed width
+    index = []
+    record = None
+    last_line = False
+    while True:
+        line = mm.readline()
+        if not line:
+            break
+        if line.startswith(b">"):
+            record = [line[1:].strip(), mm.tell(), 0, 0, 0]
+            index.append(record)
+            last_line = False
+            continue
+        if record is None:
+            return False
+        bases = len(line.rstrip(b"\\r\\n"))
+        if not bases:
+            last_line = True
+            continue
+        # only the final line of a record may be shorter
+        if last_line or (record[3] and bases > record[3]):
+            return False
+        if not record[3]:
+            record[3] = bases
+            record[4] = len(line)
+        elif bases < record[3] or len(line) != record[4]:
+            last_line = True
+        record[2] += bases
+    return index
+
+
+def write_mapped_regions(mm, index, regions):
+    for region in regions:
+        filename = f"{output_prefix}_{region}.fa"
+        start, end = region.split("_")
+        start = int(start)
+        end = int(end)
+        chunks = []
+        for name, offset, length, line_bases, line_width in index:
+            chunks.extend([b">", name, b"\\n"])
+            if length:
+                seq_start = min(start, length)
+                seq_end = min(end + 1, length)
+                # file offsets of the region start and end
+                first = offset + (seq_start // line_bases) * line_width + seq_start % line_bases
+                last = offset + (seq_end // line_bases) * line_width + seq_end % line_bases
+                chunks.append(mm[first:last].translate(u_to_t_bytes, b"\\r\\n"))
+            chunks.append(b"\\n")
+        # one buffered write per region file
+        with open(filename, "wb") as fh:
+            fh.write(b"".join(chunks))
+
+
+def write_regions(seqs, regions):
+    for region in regions:
+        filename = f"{output_prefix}_{region}.fa"
+        start, end = region.split("_")
+        start = int(start)
+        end = int(end)
+        with open(filename, "w") as fh:
+            for name, seq in seqs:
+                print(f">{name}", seq[start:end+1], sep="\\n", file=fh)
+
+
+# coordinate order keeps the written regions stable between runs
+regions = sorted(regions, key=lambda region: [int(i) for i in region.split("_")])
+index = False
+if not alignments.endswith(".gz"):
+    with open(alignments, "rb") as fh:
+        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        index = index_fasta(mm)
+        if index:
+            write_mapped_regions(mm, index, regions)
+        mm.close()
+
+if not index:
+    # compressed or irregularly wrapped alignments are read into memory
+    write_regions(list(iter_fasta(alignments)), regions)